@@ -65,6 +65,24 @@ config_manager.controlled_cvar(
     default=3,
     description=config_strings['caps_to_win'],
 )
+config_manager.controlled_cvar(
+    ufloat_handler,
+    "round_time",
+    default=0.0,
+    description=config_strings['round_time'],
+)
+config_manager.controlled_cvar(
+    ufloat_handler,
+    "overtime_length",
+    default=120.0,
+    description=config_strings['overtime_length'],
+)
+config_manager.controlled_cvar(
+    ufloat_handler,
+    "overtime_min_return_timeout",
+    default=5.0,
+    description=config_strings['overtime_min_return_timeout'],
+)
 config_manager.section(config_strings['section sounds'])
 config_manager.controlled_cvar(
     sound_nullable_handler,
@@ -121,6 +139,75 @@ config_manager.controlled_cvar(
     default=1,
     description=config_strings['allow_drop_flag_command'],
 )
+config_manager.controlled_cvar(
+    ufloat_handler,
+    "drop_flag_command_cooldown",
+    default=3.0,
+    description=config_strings['drop_flag_command_cooldown'],
+)
+config_manager.controlled_cvar(
+    uint_handler,
+    "drop_flag_command_burst",
+    default=2,
+    description=config_strings['drop_flag_command_burst'],
+)
+config_manager.controlled_cvar(
+    ufloat_handler,
+    "flag_touch_cooldown",
+    default=1.0,
+    description=config_strings['flag_touch_cooldown'],
+)
+config_manager.controlled_cvar(
+    uint_handler,
+    "flag_touch_burst",
+    default=3,
+    description=config_strings['flag_touch_burst'],
+)
+config_manager.section(config_strings['section telemetry'])
+config_manager.controlled_cvar(
+    ufloat_handler,
+    "telemetry_sample_rate",
+    default=0.0,
+    description=config_strings['telemetry_sample_rate'],
+)
+config_manager.controlled_cvar(
+    uint_handler,
+    "telemetry_buffer_size",
+    default=4096,
+    description=config_strings['telemetry_buffer_size'],
+)
+config_manager.section(config_strings['section metrics'])
+config_manager.controlled_cvar(
+    uint_handler,
+    "metrics_port",
+    default=0,
+    description=config_strings['metrics_port'],
+)
+config_manager.controlled_cvar(
+    bool_handler,
+    "trace_hooks",
+    default=0,
+    description=config_strings['trace_hooks'],
+)
+config_manager.section(config_strings['section stats'])
+config_manager.controlled_cvar(
+    bool_handler,
+    "stats_enabled",
+    default=0,
+    description=config_strings['stats_enabled'],
+)
+config_manager.controlled_cvar(
+    uint_handler,
+    "stats_buffer_size",
+    default=1024,
+    description=config_strings['stats_buffer_size'],
+)
+config_manager.controlled_cvar(
+    bool_handler,
+    "stats_spool",
+    default=1,
+    description=config_strings['stats_spool'],
+)
 
 config_manager.write()
 config_manager.execute()
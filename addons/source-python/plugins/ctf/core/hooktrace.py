@@ -0,0 +1,86 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+from enum import IntEnum
+from struct import Struct
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+HOOK_TRACE_MAGIC = b"CTFH"
+HOOK_TRACE_VERSION = 1
+HOOK_TRACE_BUFFERING = 64 * 1024
+
+# magic, version, map name
+HOOK_TRACE_HEADER = Struct("<4sB64s")
+
+# seconds since the trace started, kind, flag team, player team, player index
+HOOK_TRACE_RECORD = Struct("<fBBBB")
+
+
+class HookTraceKind(IntEnum):
+    ROUND_START = 0
+    ROUND_END = 1
+    FLAG_TOUCH = 2
+    ZONE_TOUCH = 3
+    PLAYER_DEATH = 4
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class HookTraceRecorder:
+    def __init__(self):
+        self._file = None
+        self._started_at = 0
+
+    @property
+    def recording(self):
+        return self._file is not None
+
+    def start(self, path, map_name, now):
+        if self.recording:
+            self.stop()
+
+        self._file = open(path, 'wb', buffering=HOOK_TRACE_BUFFERING)
+        self._file.write(HOOK_TRACE_HEADER.pack(
+            HOOK_TRACE_MAGIC, HOOK_TRACE_VERSION, map_name.encode('utf-8')))
+
+        self._started_at = now
+
+    def stop(self):
+        if not self.recording:
+            return
+
+        self._file.close()
+        self._file = None
+
+    def record(self, now, kind, flag_team=0, player_team=0, player_index=0):
+        if self._file is None:
+            return
+
+        self._file.write(HOOK_TRACE_RECORD.pack(
+            now - self._started_at, kind, flag_team, player_team,
+            player_index))
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def read_hook_trace(path):
+    with open(path, 'rb') as f:
+        magic, version, map_name = HOOK_TRACE_HEADER.unpack(
+            f.read(HOOK_TRACE_HEADER.size))
+
+        if magic != HOOK_TRACE_MAGIC or version != HOOK_TRACE_VERSION:
+            raise ValueError(f"Not a hook trace file: {path}")
+
+        data = f.read()
+
+    # Drop a partial record left by a server that didn't shut down cleanly
+    data = data[:len(data) - len(data) % HOOK_TRACE_RECORD.size]
+
+    return (map_name.rstrip(b'\0').decode('utf-8'),
+            list(HOOK_TRACE_RECORD.iter_unpack(data)))
@@ -0,0 +1,231 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+from array import array
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from time import perf_counter
+
+# Source.Python
+from listeners.tick import GameThread
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+METRICS_ADDRESS = "127.0.0.1"
+SUMMARY_WINDOW = 1024
+SUMMARY_QUANTILES = (0.5, 0.9, 0.99)
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+# Metrics are only ever written by the game thread and only read by the
+# exporter thread, so plain ints and arrays are enough - no locks needed
+class Counter:
+    type_ = 'counter'
+
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        for label_values, value in list(self._values.items()):
+            yield self.name, label_values, value
+
+
+class Gauge(Counter):
+    type_ = 'gauge'
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values, value):
+        self._values[label_values] = value
+
+
+class Summary(Counter):
+    type_ = 'summary'
+
+    def __init__(self, name, description, label_names=()):
+        super().__init__(name, description, label_names)
+
+        self._windows = {}
+
+    def observe(self, *label_values, value):
+        try:
+            window, state = self._windows[label_values]
+        except KeyError:
+            window = array('d', bytes(SUMMARY_WINDOW * 8))
+            state = [0, 0.0]
+            self._windows[label_values] = window, state
+
+        window[state[0] % SUMMARY_WINDOW] = value
+        state[0] += 1
+        state[1] += value
+
+    def timed(self, *label_values):
+        def decorator(callback):
+            @wraps(callback)
+            def wrapper(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    return callback(*args, **kwargs)
+                finally:
+                    self.observe(*label_values, value=perf_counter() - start)
+
+            return wrapper
+
+        return decorator
+
+    def samples(self):
+        for label_values, (window, state) in list(self._windows.items()):
+            count, sum_ = state
+            recent = sorted(window[:min(count, SUMMARY_WINDOW)])
+            for quantile in SUMMARY_QUANTILES:
+                yield (self.name, label_values + (str(quantile), ),
+                       recent[int(quantile * (len(recent) - 1))])
+
+            yield self.name + "_sum", label_values, sum_
+            yield self.name + "_count", label_values, count
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, description, label_names=()):
+        return self._register(Counter(name, description, label_names))
+
+    def gauge(self, name, description, label_names=()):
+        return self._register(Gauge(name, description, label_names))
+
+    def summary(self, name, description, label_names=()):
+        return self._register(Summary(
+            name, description, label_names + ('quantile', )))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.type_}")
+
+            for name, label_values, value in metric.samples():
+                labels = ",".join(
+                    f'{label_name}="{label_value}"'
+                    for label_name, label_value in zip(
+                        metric.label_names, label_values)
+                )
+                if labels:
+                    lines.append(f"{name}{{{labels}}} {value}")
+                else:
+                    lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.server.registry.render().encode('utf-8')
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsExporter:
+    def __init__(self, registry):
+        self.registry = registry
+
+        self._server = None
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._server is not None
+
+    def start(self, port, address=METRICS_ADDRESS):
+        if self.running:
+            raise ValueError("Metrics exporter is already running")
+
+        self._server = HTTPServer((address, port), _MetricsRequestHandler)
+        self._server.registry = self.registry
+
+        self._thread = GameThread(
+            target=self._server.serve_forever, daemon=True)
+
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        self._thread = None
+
+
+# =============================================================================
+# >> GLOBAL VARIABLES
+# =============================================================================
+metrics = MetricsRegistry()
+metrics_exporter = MetricsExporter(metrics)
+
+flag_transitions = metrics.counter(
+    "ctf_flag_transitions_total",
+    "Flag state transitions",
+    ('flag', 'transition'),
+)
+team_captures = metrics.counter(
+    "ctf_captures_total",
+    "Flags captured by each team",
+    ('team', ),
+)
+active_carriers = metrics.gauge(
+    "ctf_active_carriers",
+    "Players currently carrying a flag",
+)
+active_carriers.set(value=0)
+touch_hooks = metrics.counter(
+    "ctf_touch_hooks_total",
+    "start_touch hook invocations",
+    ('entity', ),
+)
+touch_rejections = metrics.counter(
+    "ctf_touch_rejections_total",
+    "start_touch hook invocations that did not touch a flag or zone",
+    ('entity', 'reason'),
+)
+rate_limited = metrics.counter(
+    "ctf_rate_limited_total",
+    "Player actions suppressed by the rate limiter",
+    ('action', ),
+)
+hud_sends = metrics.counter(
+    "ctf_hud_sends_total",
+    "HudMsg messages sent",
+    ('message', ),
+)
+callback_latency = metrics.summary(
+    "ctf_callback_latency_seconds",
+    "Time spent in plugin callbacks",
+    ('callback', ),
+)
@@ -2,7 +2,7 @@
 # >> IMPORTS
 # =============================================================================
 # Source.Python
-from paths import CFG_PATH, GAME_PATH
+from paths import CFG_PATH, GAME_PATH, LOG_PATH
 
 
 # =============================================================================
@@ -10,4 +10,8 @@ from paths import CFG_PATH, GAME_PATH
 # =============================================================================
 MAPDATA_PATH = GAME_PATH / "mapdata" / "ctf"
 CTF_CFG_PATH = CFG_PATH / "ctf"
-DOWNLOADLIST_PATH = CTF_CFG_PATH / "downloadlist.txt"
\ No newline at end of file
+DOWNLOADLIST_PATH = CTF_CFG_PATH / "downloadlist.txt"
+CTF_LOG_PATH = LOG_PATH / "ctf"
+TELEMETRY_PATH = CTF_LOG_PATH / "telemetry"
+STATS_SPOOL_PATH = CTF_LOG_PATH / "spool"
+HOOK_TRACE_PATH = CTF_LOG_PATH / "traces"
@@ -0,0 +1,57 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+from array import array
+from enum import IntEnum
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+class RateLimitedAction(IntEnum):
+    DROP_FLAG_COMMAND = 0
+    FLAG_TOUCH = 1
+
+ACTION_COUNT = len(RateLimitedAction)
+
+# Player indexes never exceed this in any Source engine game, while
+# max_clients isn't known for sure until the first map has loaded
+MAX_PLAYER_INDEX = 255
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class TokenBucketLimiter:
+    def __init__(self, max_index=MAX_PLAYER_INDEX):
+        self.max_index = max_index
+
+        # One slot per player index and action. A slot that was never used or
+        # got reset has no update time, so it refills to a full bucket.
+        size = (max_index + 1) * ACTION_COUNT
+        self._tokens = array('d', bytes(size * 8))
+        self._updated_at = array('d', bytes(size * 8))
+
+    def allow(self, index, action, now, cooldown, burst):
+        if cooldown <= 0:
+            return True
+
+        slot = index * ACTION_COUNT + action
+        refilled = (now - self._updated_at[slot]) / cooldown
+        tokens = min(max(burst, 1), self._tokens[slot] + refilled)
+
+        self._updated_at[slot] = now
+
+        if tokens < 1:
+            self._tokens[slot] = tokens
+            return False
+
+        self._tokens[slot] = tokens - 1
+        return True
+
+    def reset(self, index):
+        for action in RateLimitedAction:
+            slot = index * ACTION_COUNT + action
+            self._tokens[slot] = 0
+            self._updated_at[slot] = 0
@@ -0,0 +1,114 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+from enum import IntEnum
+
+# CTF
+from .rules import FlagTeam
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+class RoundPhase(IntEnum):
+    IDLE = 0
+    REGULATION = 1
+    OVERTIME = 2
+    ENDED = 3
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class RoundController:
+    def __init__(self):
+        self.phase = RoundPhase.IDLE
+        self.points = {team: 0 for team in FlagTeam}
+        self.winner = None
+
+        self._caps_to_win = 0
+        self._overtime_length = 0
+        self._phase_started_at = 0
+        self._deadline = None
+
+    def __repr__(self):
+        return f"<RoundController - {self.phase.name}>"
+
+    @property
+    def leader(self):
+        red, blue = self.points[FlagTeam.RED], self.points[FlagTeam.BLUE]
+        if red == blue:
+            return None
+
+        return FlagTeam.RED if red > blue else FlagTeam.BLUE
+
+    def _set_phase(self, phase, now, length=0):
+        self.phase = phase
+        self._phase_started_at = now
+        self._deadline = now + length if length > 0 else None
+
+    def _finish(self, winner, now):
+        self.winner = winner
+        self._set_phase(RoundPhase.ENDED, now)
+
+    def start(self, now, caps_to_win, round_time=0, overtime_length=0):
+        for team in self.points.keys():
+            self.points[team] = 0
+
+        self.winner = None
+        self._caps_to_win = caps_to_win
+        self._overtime_length = overtime_length
+        self._set_phase(RoundPhase.REGULATION, now, round_time)
+
+    def end(self, now):
+        if self.phase != RoundPhase.ENDED:
+            self._set_phase(RoundPhase.ENDED, now)
+
+    def capture(self, team, now):
+        if self.phase not in (RoundPhase.REGULATION, RoundPhase.OVERTIME):
+            return False
+
+        self.points[team] += 1
+
+        # In overtime the first capture wins
+        if (self.phase == RoundPhase.OVERTIME or
+                self.points[team] >= self._caps_to_win):
+
+            self._finish(team, now)
+            return True
+
+        return False
+
+    def tick(self, now):
+        if self._deadline is None or now < self._deadline:
+            return None
+
+        if self.phase == RoundPhase.REGULATION:
+            if self.leader is None and self._overtime_length > 0:
+                self._set_phase(
+                    RoundPhase.OVERTIME, now, self._overtime_length)
+
+            else:
+                self._finish(self.leader, now)
+
+        elif self.phase == RoundPhase.OVERTIME:
+            self._finish(None, now)
+
+        return self.phase
+
+    def time_left(self, now):
+        if self._deadline is None:
+            return None
+
+        return max(0, self._deadline - now)
+
+    def return_timeout(self, timeout, min_timeout, now):
+        # Dropped flags return faster and faster as overtime goes on
+        if (self.phase != RoundPhase.OVERTIME or timeout < 0 or
+                timeout <= min_timeout):
+
+            return timeout
+
+        progress = (now - self._phase_started_at) / self._overtime_length
+        return max(min_timeout, timeout - (timeout - min_timeout) * progress)
@@ -0,0 +1,43 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+from enum import IntEnum
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+class FlagTeam(IntEnum):
+    RED = 2
+    BLUE = 3
+
+
+class FlagState(IntEnum):
+    AT_BASE = 0
+    STOLEN = 1
+    DROPPED = 2
+
+
+# Transition name: (states it's allowed from, resulting state)
+FLAG_TRANSITIONS = {
+    'steal': ((FlagState.DROPPED, FlagState.AT_BASE), FlagState.STOLEN),
+    'drop': ((FlagState.STOLEN, ), FlagState.DROPPED),
+    'return': ((FlagState.DROPPED, ), FlagState.AT_BASE),
+    'capture': ((FlagState.STOLEN, ), FlagState.AT_BASE),
+}
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def next_flag_state(state, transition):
+    allowed_states, new_state = FLAG_TRANSITIONS[transition]
+    if state not in allowed_states:
+        raise ValueError(f"Flag state is {state} - cannot {transition}!")
+
+    return new_state
+
+
+def enemy_team(team):
+    return FlagTeam.BLUE if team == FlagTeam.RED else FlagTeam.RED
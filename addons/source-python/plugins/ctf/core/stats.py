@@ -0,0 +1,207 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+from collections import deque
+from json import dumps
+import os
+from shutil import copyfileobj
+import socket
+from threading import Event
+
+# Source.Python
+try:
+    from listeners.tick import GameThread
+except ImportError:
+    # Allows the local stand-in to stream events without a game server
+    from threading import Thread as GameThread
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+STATS_SOCKET_PATH = "/tmp/ctf-stats.sock"
+STATS_BATCH_SIZE = 256
+STATS_FLUSH_INTERVAL = 1.0
+STATS_CONNECT_TIMEOUT = 0.5
+STATS_SEND_TIMEOUT = 5.0
+STATS_SPOOL_CHUNK_SIZE = 64 * 1024
+STATS_STOP_TIMEOUT = 1.0
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class StatsStreamer:
+    def __init__(self, socket_path=STATS_SOCKET_PATH):
+        self.socket_path = socket_path
+
+        # Written by the game thread
+        self.overflowed = 0
+
+        # Written by the streamer thread
+        self.sent = 0
+        self.spooled = 0
+        self.dropped = 0
+
+        self._buffer = None
+        self._spool_path = None
+        self._socket = None
+        self._thread = None
+        self._stopped = Event()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, buffer_size, spool_path=None):
+        if self.running:
+            raise ValueError("Stats streamer is already running")
+
+        self._buffer = deque(maxlen=buffer_size)
+        self._spool_path = spool_path
+        self._stopped.clear()
+
+        self._thread = GameThread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+
+        self._stopped.set()
+
+        # Don't hold up the game thread on a stalled aggregator. Shutting the
+        # socket down fails a send in progress, and everything left over
+        # goes to the spool instead.
+        connection = self._socket
+        if connection is not None:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+        self._thread.join(STATS_STOP_TIMEOUT)
+        self._thread = None
+
+    def push(self, event):
+        if not self.running:
+            return
+
+        # deque.append is atomic and never blocks; once the buffer is full
+        # the oldest event falls out of it
+        if len(self._buffer) == self._buffer.maxlen:
+            self.overflowed += 1
+
+        self._buffer.append(event)
+
+    def _run(self):
+        while not self._stopped.wait(STATS_FLUSH_INTERVAL):
+            self._flush()
+
+        self._flush()
+        self._disconnect()
+
+    def _flush(self):
+        while self._buffer:
+            batch = []
+            while self._buffer and len(batch) < STATS_BATCH_SIZE:
+                batch.append(dumps(self._buffer.popleft()) + "\n")
+
+            self._send(batch)
+
+    def _connect(self):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(STATS_CONNECT_TIMEOUT)
+        try:
+            self._socket.connect(self.socket_path)
+        except OSError:
+            self._disconnect()
+            return False
+
+        self._socket.settimeout(STATS_SEND_TIMEOUT)
+        return self._replay_spool()
+
+    def _disconnect(self):
+        if self._socket is None:
+            return
+
+        self._socket.close()
+        self._socket = None
+
+    def _send(self, batch):
+        if self._stopped.is_set():
+            self._spool(batch)
+            return
+
+        if self._socket is None and not self._connect():
+            self._spool(batch)
+            return
+
+        try:
+            self._socket.sendall("".join(batch).encode('utf-8'))
+        except OSError:
+            self._disconnect()
+            self._spool(batch)
+            return
+
+        self.sent += len(batch)
+
+    def _spool(self, batch):
+        if self._spool_path is None:
+            self.dropped += len(batch)
+            return
+
+        with open(self._spool_path, 'a') as f:
+            f.writelines(batch)
+
+        self.spooled += len(batch)
+
+    def _replay_spool(self):
+        if self._spool_path is None or not os.path.isfile(self._spool_path):
+            return True
+
+        # Offset just past the last line the aggregator got in full. A line
+        # that was cut off is dropped by the aggregator, so it's sent again.
+        confirmed = 0
+        with open(self._spool_path, 'rb') as f:
+            try:
+                while True:
+                    chunk_start = f.tell()
+                    chunk = f.read(STATS_SPOOL_CHUNK_SIZE)
+                    if not chunk:
+                        break
+
+                    view = memoryview(chunk)
+                    offset = 0
+                    while offset < len(chunk):
+                        offset += self._socket.send(view[offset:])
+
+                        line_end = chunk.rfind(b"\n", 0, offset)
+                        if line_end != -1:
+                            confirmed = chunk_start + line_end + 1
+
+            except OSError:
+                self._disconnect()
+                self._truncate_spool(f, confirmed)
+                return False
+
+        os.remove(self._spool_path)
+        return True
+
+    def _truncate_spool(self, f, offset):
+        if offset == 0:
+            return
+
+        remainder_path = f"{self._spool_path}.tmp"
+        with open(remainder_path, 'wb') as remainder:
+            f.seek(offset)
+            copyfileobj(f, remainder)
+
+        os.replace(remainder_path, self._spool_path)
+
+
+# =============================================================================
+# >> GLOBAL VARIABLES
+# =============================================================================
+stats_streamer = StatsStreamer()
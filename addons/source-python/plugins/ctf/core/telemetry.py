@@ -0,0 +1,85 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+from array import array
+from struct import Struct
+from sys import byteorder
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+TRAIL_MAGIC = b"CTFT"
+TRAIL_VERSION = 1
+
+# magic, version, team, sample count; followed by float32 x, y, z triplets
+TRAIL_HEADER = Struct("<4sBBI")
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class CarrierTrail:
+    def __init__(self, capacity):
+        self.capacity = capacity
+
+        self._buffer = array('f', bytes(capacity * 3 * 4))
+        self._cursor = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        self._cursor = 0
+        self._count = 0
+
+    def sample(self, x, y, z):
+        if not self.capacity:
+            return
+
+        buffer = self._buffer
+        offset = self._cursor * 3
+        buffer[offset] = x
+        buffer[offset + 1] = y
+        buffer[offset + 2] = z
+
+        self._cursor += 1
+        if self._cursor == self.capacity:
+            self._cursor = 0
+
+        if self._count < self.capacity:
+            self._count += 1
+
+    def to_array(self):
+        if self._count < self.capacity:
+            return self._buffer[:self._count * 3]
+
+        # The buffer has wrapped - the oldest sample sits at the cursor
+        offset = self._cursor * 3
+        return self._buffer[offset:] + self._buffer[:offset]
+
+    def dump(self, path, team):
+        samples = self.to_array()
+        if byteorder != 'little':
+            samples.byteswap()
+
+        with open(path, 'wb') as f:
+            f.write(TRAIL_HEADER.pack(
+                TRAIL_MAGIC, TRAIL_VERSION, team, self._count))
+
+            samples.tofile(f)
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def read_trail_header(f):
+    magic, version, team, count = TRAIL_HEADER.unpack(
+        f.read(TRAIL_HEADER.size))
+
+    if magic != TRAIL_MAGIC or version != TRAIL_VERSION:
+        raise ValueError(f"Not a carrier trail file: {f.name}")
+
+    return team, count
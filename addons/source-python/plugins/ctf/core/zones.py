@@ -0,0 +1,136 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+from enum import IntEnum
+from itertools import chain
+from math import floor
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+ZONE_CELL_SIZE = 256
+ZONE_SNAP_MARGIN = 16
+
+# Zones spanning more cells than this are checked on every lookup instead
+ZONE_MAX_CELLS = 512
+
+
+class ZoneType(IntEnum):
+    NO_DROP = 0
+    HAZARD = 1
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class Zone:
+    def __init__(self, zone_type, point1, point2, flag=None):
+        self.zone_type = zone_type
+
+        # Zones that belong to a flag only apply to that flag
+        self.flag = flag
+        self.mins = tuple(map(min, point1, point2))
+        self.maxs = tuple(map(max, point1, point2))
+
+    def __repr__(self):
+        return f"<Zone ({self.zone_type.name}) - {self.mins} {self.maxs}>"
+
+    def applies_to(self, flag):
+        return self.flag is None or self.flag == flag
+
+    def contains(self, x, y, z):
+        mins, maxs = self.mins, self.maxs
+        return (mins[0] <= x <= maxs[0] and
+                mins[1] <= y <= maxs[1] and
+                mins[2] <= z <= maxs[2])
+
+
+class ZoneIndex:
+    def __init__(self, cell_size=ZONE_CELL_SIZE):
+        self.cell_size = cell_size
+
+        self._zones = []
+        self._large_zones = []
+        self._grid = {}
+
+    def __len__(self):
+        return len(self._zones)
+
+    def _cell(self, x, y, z):
+        cell_size = self.cell_size
+        return floor(x / cell_size), floor(y / cell_size), floor(z / cell_size)
+
+    def add(self, zone_type, point1, point2, flag=None):
+        zone = Zone(zone_type, point1, point2, flag)
+        self._zones.append(zone)
+
+        min_cell = self._cell(*zone.mins)
+        max_cell = self._cell(*zone.maxs)
+
+        cells = 1
+        for min_coord, max_coord in zip(min_cell, max_cell):
+            cells *= max_coord - min_coord + 1
+
+        if cells > ZONE_MAX_CELLS:
+            self._large_zones.append(zone)
+            return zone
+
+        for cell_x in range(min_cell[0], max_cell[0] + 1):
+            for cell_y in range(min_cell[1], max_cell[1] + 1):
+                for cell_z in range(min_cell[2], max_cell[2] + 1):
+                    self._grid.setdefault(
+                        (cell_x, cell_y, cell_z), []).append(zone)
+
+        return zone
+
+    def clear(self):
+        self._zones.clear()
+        self._large_zones.clear()
+        self._grid.clear()
+
+    def find(self, x, y, z, flag=None):
+        if not self._zones:
+            return None
+
+        # Hazards take precedence over no-drop zones they overlap
+        found = None
+        for zone in chain(
+                self._large_zones, self._grid.get(self._cell(x, y, z), ())):
+
+            if not zone.applies_to(flag) or not zone.contains(x, y, z):
+                continue
+
+            if zone.zone_type == ZoneType.HAZARD:
+                return zone
+
+            if found is None:
+                found = zone
+
+        return found
+
+    def snap(self, x, y, z, flag=None):
+        # Points inside of no-drop zones are pushed out horizontally through
+        # the closest side of the zone. Points inside of hazard zones, or ones
+        # that can't be pushed into free space, have no valid drop point.
+        zone = self.find(x, y, z, flag)
+        if zone is None:
+            return x, y, z
+
+        if zone.zone_type == ZoneType.HAZARD:
+            return None
+
+        mins, maxs = zone.mins, zone.maxs
+        candidates = sorted((
+            (x - mins[0], (mins[0] - ZONE_SNAP_MARGIN, y, z)),
+            (maxs[0] - x, (maxs[0] + ZONE_SNAP_MARGIN, y, z)),
+            (y - mins[1], (x, mins[1] - ZONE_SNAP_MARGIN, z)),
+            (maxs[1] - y, (x, maxs[1] + ZONE_SNAP_MARGIN, z)),
+        ))
+
+        for distance, candidate in candidates:
+            if self.find(*candidate, flag) is None:
+                return candidate
+
+        return None
@@ -3,12 +3,13 @@
 # =============================================================================
 # Python
 from configparser import ConfigParser
-from enum import IntEnum
 from time import time
 
 # Source.Python
 from colors import Color
 from commands.say import SayCommand
+from core import echo_console
+from cvars import ConVar
 from engines.precache import Model
 from engines.server import global_vars
 from engines.trace import (
@@ -21,7 +22,7 @@ from entities.hooks import EntityCondition, EntityPostHook, EntityPreHook
 from events import Event
 from filters.players import PlayerIter
 from listeners import OnLevelInit
-from listeners.tick import Delay, Repeat
+from listeners.tick import Delay, Repeat, RepeatStatus
 from mathlib import Vector
 from messages import HudMsg, SayText2
 from players.dictionary import PlayerDictionary
@@ -30,8 +31,21 @@ from stringtables.downloads import Downloadables
 
 # CTF
 from .core.cvars import config_manager
-from .core.paths import DOWNLOADLIST_PATH, MAPDATA_PATH
+from .core.hooktrace import HookTraceKind, HookTraceRecorder
+from .core.metrics import (
+    active_carriers, callback_latency, flag_transitions, hud_sends,
+    metrics_exporter, rate_limited, team_captures, touch_hooks,
+    touch_rejections)
+from .core.paths import (
+    DOWNLOADLIST_PATH, HOOK_TRACE_PATH, MAPDATA_PATH, STATS_SPOOL_PATH,
+    TELEMETRY_PATH)
+from .core.ratelimit import RateLimitedAction, TokenBucketLimiter
+from .core.rounds import RoundController, RoundPhase
+from .core.rules import FlagState, FlagTeam, next_flag_state
+from .core.stats import stats_streamer
 from .core.strings import colorize, common_strings, strip_colors, tagged
+from .core.telemetry import CarrierTrail
+from .core.zones import ZoneIndex, ZoneType
 from .info import info
 
 
@@ -65,17 +79,7 @@ FLAGMSG_HOLDTIME = 2
 FLAGMSG_FXTIME = 0
 FLAGMSG_CHANNEL = 6
 
-
-class FlagTeam(IntEnum):
-    RED = 2
-    BLUE = 3
-
-
-class FlagState(IntEnum):
-    AT_BASE = 0
-    STOLEN = 1
-    DROPPED = 2
-
+ROUND_TIMER_INTERVAL = 0.5
 
 WIN_CONDITIONS = {
     0: 9,  # Round draw
@@ -88,12 +92,16 @@ WIN_CONDITIONS = {
 # >> GLOBAL VARIABLES
 # =============================================================================
 _flags = {}
-_team_points = {}
-_round_end = False
+_round_controller = RoundController()
+_zone_index = ZoneIndex()
+_rate_limiter = TokenBucketLimiter()
+_hook_trace = HookTraceRecorder()
 
 _ecx_storage_start_touch_flags = {}
 _ecx_storage_start_touch_zones = {}
 
+_server_port = ConVar('hostport')
+
 downloadables = Downloadables()
 with open(DOWNLOADLIST_PATH) as f:
     for line in f:
@@ -110,6 +118,7 @@ with open(DOWNLOADLIST_PATH) as f:
 class CTFPlayerDictionary(PlayerDictionary):
     def on_automatically_removed(self, index):
         ctfplayer = self[index]
+        _rate_limiter.reset(index)
 
         for flag in _flags.values():
             if flag.ctfplayer is not None and flag.ctfplayer == ctfplayer:
@@ -162,8 +171,12 @@ class Flag:
         self._ctfplayer = None
         self._state = FlagState.AT_BASE
         self._dropped_at = 0
+        self._return_timeout = 0
         self._return_delay = None
 
+        self.carrier_trail = CarrierTrail(
+            config_manager['telemetry_buffer_size'])
+
     def __repr__(self):
         return f"<Flag ({self.team.name}) - {self._state.name}>"
 
@@ -185,8 +198,7 @@ class Flag:
                 player=self.ctfplayer.name)
 
         if self.state == FlagState.DROPPED:
-            time_left = config_manager['dropped_flag_return_timeout']
-            time_left -= time() - self._dropped_at
+            time_left = self._return_timeout - (time() - self._dropped_at)
 
             return common_strings['location dropped'].tokenized(
                 time=time_left
@@ -244,6 +256,8 @@ class Flag:
         self._entity.teleport(origin)
         self._entity.spawn()
 
+        return origin
+
     def _remove_entity(self):
         self._entity.remove()
         self._entity = None
@@ -259,7 +273,10 @@ class Flag:
         return enemy_players, team_players
 
     def init(self):
+        # The round restart may have taken the flag away from its carrier
         self._state = FlagState.AT_BASE
+        self._ctfplayer = None
+        self._dropped_at = 0
         self._spawn_entity()
 
         if self._return_delay is not None and self._return_delay.running:
@@ -287,10 +304,7 @@ class Flag:
         entity.maxs = Vector(max(v1.x, v2.x), max(v1.y, v2.y), max(v1.z, v2.z))
 
     def steal(self, ctfplayer):
-        if self._state not in (FlagState.DROPPED, FlagState.AT_BASE):
-            raise ValueError(f"Flag state is {self._state} - cannot steal!")
-
-        self._state = FlagState.STOLEN
+        self._state = next_flag_state(self._state, 'steal')
         self._dropped_at = 0
 
         self._remove_entity()
@@ -299,6 +313,10 @@ class Flag:
         if self._return_delay is not None and self._return_delay.running:
             self._return_delay.cancel()
 
+        flag_transitions.inc(self.team.name.lower(), 'steal')
+        active_carriers.inc()
+        stream_flag_event(self, 'steal', self.ctfplayer)
+
         send_flag_message(common_strings['flag stolen'], self, self.ctfplayer)
 
         enemy_players, team_players = self._split_players()
@@ -306,39 +324,61 @@ class Flag:
         config_manager['enemy_flag_stolen_sound'].play(*enemy_players)
 
     def drop(self):
-        if self._state != FlagState.STOLEN:
-            raise ValueError(f"Flag state is {self._state} - cannot drop!")
-
-        self._state = FlagState.DROPPED
+        self._state = next_flag_state(self._state, 'drop')
         self._dropped_at = time()
 
+        flag_transitions.inc(self.team.name.lower(), 'drop')
+        active_carriers.dec()
+        stream_flag_event(self, 'drop', self.ctfplayer)
+
+        return_timeout = _round_controller.return_timeout(
+            config_manager['dropped_flag_return_timeout'],
+            config_manager['overtime_min_return_timeout'],
+            self._dropped_at)
+
         origin = self.ctfplayer.origin
-        self._spawn_entity(origin)
+        drop_origin = _zone_index.snap(
+            origin.x, origin.y, origin.z, self.team)
+        if drop_origin is not None:
+            origin = Vector(*drop_origin)
+
+        origin = self._spawn_entity(origin)
+
+        # Flags that fell into a hazard or still landed in a zone go home
+        if (drop_origin is None or
+                _zone_index.find(
+                    origin.x, origin.y, origin.z, self.team) is not None):
+
+            return_timeout = 0
 
         send_flag_message(common_strings['flag dropped'], self, self.ctfplayer)
 
         self._ctfplayer = None
 
+        self._return_timeout = return_timeout
         self._return_delay = Delay(
-            config_manager['dropped_flag_return_timeout'],
-            self.return_, cancel_on_level_end=True)
+            return_timeout, self.return_, cancel_on_level_end=True)
 
         enemy_players, team_players = self._split_players()
         config_manager['team_flag_dropped_sound'].play(*team_players)
         config_manager['enemy_flag_dropped_sound'].play(*enemy_players)
 
     def return_(self, player=None):
-        if self._state != FlagState.DROPPED:
-            raise ValueError(f"Flag state is {self._state} - cannot return!")
-
-        self._state = FlagState.AT_BASE
+        self._state = next_flag_state(self._state, 'return')
         self._dropped_at = 0
 
         self._remove_entity()
         self._spawn_entity()
 
+        # A player return leaves the timed return pending
+        if self._return_delay is not None and self._return_delay.running:
+            self._return_delay.cancel()
+
         self._return_delay = None
 
+        flag_transitions.inc(self.team.name.lower(), 'return')
+        stream_flag_event(self, 'return', player)
+
         if player is None:
             send_flag_message(common_strings['flag returned'], self)
         else:
@@ -350,16 +390,17 @@ class Flag:
         config_manager['enemy_flag_returned_sound'].play(*enemy_players)
 
     def capture(self):
-        if self._state != FlagState.STOLEN:
-            raise ValueError(f"Flag state is {self._state} - cannot capture!")
+        self._state = next_flag_state(self._state, 'capture')
 
-        self._state = FlagState.AT_BASE
+        flag_transitions.inc(self.team.name.lower(), 'capture')
+        team_captures.inc(self.ctfplayer.team.name.lower())
+        active_carriers.dec()
+        stream_flag_event(self, 'capture', self.ctfplayer)
 
         send_flag_message(
             common_strings['flag captured'], self, self.ctfplayer)
 
-        _team_points[self.ctfplayer.team] += 1
-        if _team_points[self.ctfplayer.team] >= config_manager['caps_to_win']:
+        if _round_controller.capture(self.ctfplayer.team, time()):
             victory(self.ctfplayer.team)
         else:
             self._spawn_entity()
@@ -375,15 +416,80 @@ class Flag:
 # >> FUNCTIONS
 # =============================================================================
 def victory(team):
-    message = common_strings['team victory ' + team.name.lower()]
-    SayText2(tagged(colorize(message))).send()
+    if team is None:
+        message = common_strings['team victory draw']
+    else:
+        message = common_strings['team victory ' + team.name.lower()]
 
-    for team in _team_points.keys():
-        _team_points[team] = 0
+    SayText2(tagged(colorize(message))).send()
 
     info_map_parameters = Entity.find_or_create('info_map_parameters')
     info_map_parameters.fire_win_condition(WIN_CONDITIONS.get(
-        team.value, WIN_CONDITIONS[0]))
+        0 if team is None else team.value, WIN_CONDITIONS[0]))
+
+
+def dump_carrier_trails():
+    path = TELEMETRY_PATH / global_vars.map_name
+    for flag in _flags.values():
+        if not flag.carrier_trail:
+            continue
+
+        path.makedirs_p()
+        flag.carrier_trail.dump(
+            path / f"{int(time())}_{flag.team.name.lower()}.bin",
+            flag.team.value)
+
+        flag.carrier_trail.clear()
+
+
+def start_hook_trace(map_name):
+    HOOK_TRACE_PATH.makedirs_p()
+    _hook_trace.start(
+        HOOK_TRACE_PATH / f"{map_name}_{int(time())}.trace", map_name, time())
+
+
+def record_touch(kind, entity_index, other_index):
+    flag_team = 0
+    for flag in _flags.values():
+        if entity_index in (
+                flag.entity_index, flag.capture_zone_entity_index):
+
+            flag_team = flag.team.value
+            break
+
+    # Touches by non-player entities are kept as player index 0
+    try:
+        player = ctfplayers[other_index].player
+    except ValueError:
+        _hook_trace.record(time(), kind, flag_team)
+    else:
+        _hook_trace.record(
+            time(), kind, flag_team, player.team, other_index)
+
+
+def stream_flag_event(flag, event, player=None):
+    stats_streamer.push({
+        'server': _server_port.get_int(),
+        'map': global_vars.map_name,
+        'time': time(),
+        'flag': flag.team.name.lower(),
+        'event': event,
+        'player': None if player is None else player.steamid,
+        'name': None if player is None else player.name,
+    })
+
+
+def stream_round_event(event):
+    # Round markers let offline tools tell rounds apart from idle time
+    stats_streamer.push({
+        'server': _server_port.get_int(),
+        'map': global_vars.map_name,
+        'time': time(),
+        'flag': None,
+        'event': event,
+        'player': None,
+        'name': None,
+    })
 
 
 def send_flag_message(message, flag, player=None):
@@ -412,6 +518,7 @@ def send_flag_message(message, flag, player=None):
         fx_time=HUDMSG_FXTIME,
         channel=HUDMSG_CHANNEL,
     ).send()
+    hud_sends.inc('flag_message')
 
 
 def get_server_file(path):
@@ -421,12 +528,45 @@ def get_server_file(path):
     return path
 
 
+def tuple_from_str(str_):
+    return tuple(map(lambda x: float(x.strip()), str_.split(',')))
+
+
 def vector_from_str(str_):
-    return Vector(*list(map(lambda x: float(x.strip()), str_.split(','))))
+    return Vector(*tuple_from_str(str_))
+
+
+def load_zones(config):
+    _zone_index.clear()
+
+    for section in config.sections():
+        flag = None
+
+        # A flag is never left lying in the zone where it gets captured
+        if section in ('red_flag', 'blue_flag'):
+            zone_type = ZoneType.NO_DROP
+            point1_key = 'capture_zone_point1'
+            point2_key = 'capture_zone_point2'
+            flag = FlagTeam[section[:-len('_flag')].upper()]
+        elif section.startswith('no_drop_zone'):
+            zone_type = ZoneType.NO_DROP
+            point1_key, point2_key = 'point1', 'point2'
+        elif section.startswith('hazard_zone'):
+            zone_type = ZoneType.HAZARD
+            point1_key, point2_key = 'point1', 'point2'
+        else:
+            continue
+
+        _zone_index.add(
+            zone_type,
+            tuple_from_str(config[section][point1_key]),
+            tuple_from_str(config[section][point2_key]),
+            flag)
 
 
 def load_map_data(map_name):
     _flags.clear()
+    _zone_index.clear()
 
     path_ini = get_server_file(MAPDATA_PATH / f"{map_name}.ini")
 
@@ -456,6 +596,8 @@ def load_map_data(map_name):
             FlagTeam.BLUE, FLAG_MODEL, BLUE_FLAG_COLOR, GLOW_DISTANCE,
             blue_origin, blue_capture_zone_point1, blue_capture_zone_point2)
 
+        load_zones(config)
+
 
 # =============================================================================
 # >> LOAD & UNLOAD
@@ -464,16 +606,51 @@ def load():
     if global_vars.map_name is not None:
         load_map_data(global_vars.map_name)
 
+    if config_manager['metrics_port']:
+        try:
+            metrics_exporter.start(config_manager['metrics_port'])
+        except OSError as e:
+            # Most likely another server on this box has taken the port
+            echo_console(
+                f"[CTF] Metrics exporter is disabled, can't listen on port "
+                f"{config_manager['metrics_port']}: {e}")
+
+    if config_manager['trace_hooks'] and global_vars.map_name is not None:
+        start_hook_trace(global_vars.map_name)
+
+    if config_manager['stats_enabled']:
+        # One spool per instance, as several may share the game directory
+        STATS_SPOOL_PATH.makedirs_p()
+        stats_streamer.start(
+            config_manager['stats_buffer_size'],
+            STATS_SPOOL_PATH / f"{_server_port.get_int()}.jsonl"
+            if config_manager['stats_spool'] else None)
+
+
+def unload():
+    metrics_exporter.stop()
+    stats_streamer.stop()
+    _hook_trace.stop()
+
 
 # =============================================================================
 # >> EVENTS
 # =============================================================================
 @SayCommand(['!dropflag', '!df'])
+@callback_latency.timed('say_df')
 def say_df(command, index, team_only):
     if not config_manager['allow_drop_flag_command']:
         SayText2(tagged(colorize(common_strings['disabled']))).send(index)
         return
 
+    if not _rate_limiter.allow(
+            index, RateLimitedAction.DROP_FLAG_COMMAND, time(),
+            config_manager['drop_flag_command_cooldown'],
+            config_manager['drop_flag_command_burst']):
+
+        rate_limited.inc('drop_flag_command')
+        return
+
     ctfplayer = ctfplayers[index]
     for flag in _flags.values():
         if flag.ctfplayer is not None and flag.ctfplayer == ctfplayer:
@@ -490,30 +667,66 @@ def say_df(command, index, team_only):
 # >> EVENTS
 # =============================================================================
 @Event('round_start')
+@callback_latency.timed('round_start')
 def on_round_start(game_event):
-    global _round_end
-    _round_end = False
+    if _hook_trace.recording:
+        _hook_trace.record(time(), HookTraceKind.ROUND_START)
+
+    _round_controller.start(
+        time(),
+        config_manager['caps_to_win'],
+        config_manager['round_time'],
+        config_manager['overtime_length'],
+    )
+    stream_round_event('round_start')
 
-    for team in _team_points.keys():
-        _team_points[team] = 0
+    # The round timer is only needed when the plugin decides timed out rounds
+    if repeat_round_timer.status == RepeatStatus.RUNNING:
+        repeat_round_timer.stop()
 
-    for team in FlagTeam:
-        _team_points[team] = 0
+    if config_manager['round_time'] > 0:
+        repeat_round_timer.start(ROUND_TIMER_INTERVAL)
 
     for flag in _flags.values():
+        flag.carrier_trail.clear()
         flag.init()
         flag.init_capture_zone()
 
+    active_carriers.set(value=0)
+
+    if repeat_sample_carriers.status == RepeatStatus.RUNNING:
+        repeat_sample_carriers.stop()
+
+    if config_manager['telemetry_sample_rate'] > 0:
+        repeat_sample_carriers.start(
+            1 / config_manager['telemetry_sample_rate'])
+
 
 @Event('round_end')
+@callback_latency.timed('round_end')
 def on_round_end(game_event):
-    global _round_end
-    _round_end = True
+    if _hook_trace.recording:
+        _hook_trace.record(time(), HookTraceKind.ROUND_END)
+
+    _round_controller.end(time())
+    stream_round_event('round_end')
+
+    if repeat_round_timer.status == RepeatStatus.RUNNING:
+        repeat_round_timer.stop()
+
+    dump_carrier_trails()
 
 
 @Event('player_death')
+@callback_latency.timed('player_death')
 def on_player_death(game_event):
     ctfplayer = ctfplayers.from_userid(game_event['userid'])
+
+    if _hook_trace.recording:
+        _hook_trace.record(
+            time(), HookTraceKind.PLAYER_DEATH, 0, ctfplayer.player.team,
+            ctfplayer.index)
+
     for flag in _flags.values():
         if flag.ctfplayer is not None and flag.ctfplayer == ctfplayer:
             flag.drop()
@@ -525,6 +738,7 @@ def on_player_death(game_event):
 # =============================================================================
 @EntityPreHook(EntityCondition.equals_entity_classname(
     'trigger_multiple'), "start_touch")
+@callback_latency.timed('zone_pre_start_touch')
 def pre_start_touch(stack_data):
     entity_index = index_from_pointer(stack_data[0])
     other_index = index_from_pointer(stack_data[1])
@@ -534,6 +748,7 @@ def pre_start_touch(stack_data):
 
 @EntityPreHook(EntityCondition.equals_entity_classname(
     'prop_dynamic_glow'), "start_touch")
+@callback_latency.timed('flag_pre_start_touch')
 def pre_start_touch(stack_data):
     entity_index = index_from_pointer(stack_data[0])
     other_index = index_from_pointer(stack_data[1])
@@ -543,21 +758,30 @@ def pre_start_touch(stack_data):
 
 @EntityPostHook(EntityCondition.equals_entity_classname(
     'trigger_multiple'), "start_touch")
+@callback_latency.timed('zone_post_start_touch')
 def post_start_touch(stack_data, ret_val):
     entity_index, other_index = _ecx_storage_start_touch_zones.pop(
         stack_data.registers.esp.address.address)
 
+    touch_hooks.inc('zone')
+
+    if _hook_trace.recording:
+        record_touch(HookTraceKind.ZONE_TOUCH, entity_index, other_index)
+
     try:
         ctfplayer = ctfplayers[other_index]
     except ValueError:
+        touch_rejections.inc('zone', 'not_player')
         return
 
     if ctfplayer.team is None:
+        touch_rejections.inc('zone', 'no_team')
         return
 
     if (config_manager['capping_requires_flag_at_base'] and
             _flags[ctfplayer.team].state != FlagState.AT_BASE):
 
+        touch_rejections.inc('zone', 'flag_not_at_base')
         return
 
     for flag in _flags.values():
@@ -572,29 +796,52 @@ def post_start_touch(stack_data, ret_val):
 
 @EntityPostHook(EntityCondition.equals_entity_classname(
     'prop_dynamic_glow'), "start_touch")
+@callback_latency.timed('flag_post_start_touch')
 def post_start_touch(stack_data, ret_val):
     entity_index, other_index = _ecx_storage_start_touch_flags.pop(
         stack_data.registers.esp.address.address)
 
+    touch_hooks.inc('flag')
+
+    if _hook_trace.recording:
+        record_touch(HookTraceKind.FLAG_TOUCH, entity_index, other_index)
+
     try:
         ctfplayer = ctfplayers[other_index]
     except ValueError:
+        touch_rejections.inc('flag', 'not_player')
         return
 
     if ctfplayer.team is None:
+        touch_rejections.inc('flag', 'no_team')
         return
 
     if time() - ctfplayer.dropped_flag_at < DROP_FLAG_COMMAND_DELAY:
+        touch_rejections.inc('flag', 'drop_cooldown')
         return
 
     for flag in _flags.values():
         if flag.entity_index != entity_index:
             continue
 
+        if ctfplayer.team == flag.team and (
+                not config_manager['team_can_return_flag'] or
+                flag.state != FlagState.DROPPED):
+
+            break
+
+        if not _rate_limiter.allow(
+                ctfplayer.index, RateLimitedAction.FLAG_TOUCH, time(),
+                config_manager['flag_touch_cooldown'],
+                config_manager['flag_touch_burst']):
+
+            touch_rejections.inc('flag', 'rate_limited')
+            rate_limited.inc('flag_touch')
+            break
+
         if ctfplayer.team != flag.team:
             flag.steal(ctfplayer)
-
-        elif config_manager['team_can_return_flag']:
+        else:
             flag.return_(ctfplayer)
 
         break
@@ -607,22 +854,44 @@ def post_start_touch(stack_data, ret_val):
 def listener_on_level_init(map_name):
     load_map_data(map_name)
 
+    if config_manager['trace_hooks']:
+        start_hook_trace(map_name)
+    else:
+        _hook_trace.stop()
+
 
 # =============================================================================
 # >> REPEATS
 # =============================================================================
 @Repeat
+@callback_latency.timed('flag_stat_display')
 def repeat_flag_stat_display():
-    if not _flags or not _team_points:
+    if not _flags or _round_controller.phase == RoundPhase.IDLE:
         return
 
+    flag_stats = common_strings['flag_stats'].tokenized(
+        red_points=_round_controller.points[FlagTeam.RED],
+        red_flag=_flags[FlagTeam.RED.value].state_string,
+        blue_points=_round_controller.points[FlagTeam.BLUE],
+        blue_flag=_flags[FlagTeam.BLUE.value].state_string,
+    )
+
+    time_left = _round_controller.time_left(time())
+    if time_left is not None:
+        if _round_controller.phase == RoundPhase.OVERTIME:
+            round_time = common_strings['round time overtime']
+        else:
+            round_time = common_strings['round time left']
+
+        minutes, seconds = divmod(int(time_left), 60)
+        flag_stats = common_strings['flag_stats timed'].tokenized(
+            flag_stats=flag_stats,
+            round_time=round_time.tokenized(
+                minutes=minutes, seconds=seconds),
+        )
+
     HudMsg(
-        common_strings['flag_stats'].tokenized(
-            red_points=_team_points[FlagTeam.RED.value],
-            red_flag=_flags[FlagTeam.RED.value].state_string,
-            blue_points=_team_points[FlagTeam.BLUE.value],
-            blue_flag=_flags[FlagTeam.BLUE.value].state_string,
-        ),
+        flag_stats,
         color1=FLAGMSG_COLOR,
         x=FLAGMSG_X,
         y=FLAGMSG_Y,
@@ -633,5 +902,32 @@ def repeat_flag_stat_display():
         fx_time=FLAGMSG_FXTIME,
         channel=FLAGMSG_CHANNEL
     ).send()
+    hud_sends.inc('flag_stats')
 
 repeat_flag_stat_display.start(1.0)
+
+
+@Repeat
+@callback_latency.timed('sample_carriers')
+def repeat_sample_carriers():
+    for flag in _flags.values():
+        if flag.state != FlagState.STOLEN:
+            continue
+
+        origin = flag.ctfplayer.origin
+        flag.carrier_trail.sample(origin.x, origin.y, origin.z)
+
+
+@Repeat
+@callback_latency.timed('round_timer')
+def repeat_round_timer():
+    phase = _round_controller.tick(time())
+    if phase is None:
+        return
+
+    if phase == RoundPhase.OVERTIME:
+        SayText2(tagged(colorize(common_strings['overtime']))).send()
+
+    elif phase == RoundPhase.ENDED:
+        repeat_round_timer.stop()
+        victory(_round_controller.winner)
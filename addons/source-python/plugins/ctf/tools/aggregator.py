@@ -0,0 +1,272 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+from argparse import ArgumentParser
+from json import loads
+import os
+from queue import Empty, Queue
+from signal import SIG_IGN, SIGTERM, signal
+import socketserver
+import sqlite3
+from threading import Thread
+
+# CTF
+from ..core.stats import STATS_SOCKET_PATH
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+WRITE_BATCH_SIZE = 1024
+WRITE_INTERVAL = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    server INTEGER NOT NULL,
+    map TEXT NOT NULL,
+    time REAL NOT NULL,
+    flag TEXT,
+    event TEXT NOT NULL,
+    player TEXT,
+    name TEXT
+);
+CREATE INDEX IF NOT EXISTS events_player ON events (player);
+
+CREATE VIEW IF NOT EXISTS leaderboard AS
+SELECT
+    player,
+    MAX(name) AS name,
+    SUM(event = 'capture') AS captures,
+    SUM(event = 'steal') AS steals,
+    SUM(event = 'return') AS returns,
+    SUM(event = 'drop') AS drops,
+    COUNT(DISTINCT server) AS servers
+FROM events
+WHERE player IS NOT NULL
+GROUP BY player
+ORDER BY captures DESC, steals DESC;
+
+CREATE VIEW IF NOT EXISTS server_leaderboard AS
+SELECT
+    server,
+    map,
+    SUM(event = 'capture' AND flag = 'blue') AS red_captures,
+    SUM(event = 'capture' AND flag = 'red') AS blue_captures,
+    COUNT(flag) AS events
+FROM events
+GROUP BY server, map
+ORDER BY server, map;
+"""
+
+REQUIRED_EVENT_FIELDS = ('server', 'map', 'time', 'event')
+
+# Round markers have no flag
+OPTIONAL_EVENT_FIELDS = ('flag', 'player', 'name')
+
+INSERT_EVENT = """
+INSERT INTO events (server, map, time, flag, event, player, name)
+VALUES (:server, :map, :time, :flag, :event, :player, :name)
+"""
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class _StatsRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                self.server.events.put(parse_event(line))
+            except ValueError:
+                continue
+
+
+class StatsServer(socketserver.ThreadingMixIn,
+                  socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, events):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+        super().__init__(socket_path, _StatsRequestHandler)
+        self.events = events
+
+
+class StatsWriter(Thread):
+    def __init__(self, database_path, events):
+        super().__init__(daemon=True)
+
+        self.database_path = database_path
+        self.events = events
+        self.written = 0
+        self.rejected = 0
+
+    def run(self):
+        connection = open_database(self.database_path)
+        stopped = False
+        while not stopped:
+            batch = []
+            try:
+                batch.append(self.events.get(timeout=WRITE_INTERVAL))
+                while len(batch) < WRITE_BATCH_SIZE:
+                    batch.append(self.events.get_nowait())
+            except Empty:
+                pass
+
+            # None is queued by serve() on shutdown
+            if batch and batch[-1] is None:
+                batch.pop()
+                stopped = True
+
+            if not batch:
+                continue
+
+            try:
+                write_events(connection, batch)
+                self.written += len(batch)
+            except sqlite3.Error:
+                # Find the offending events instead of losing the whole batch
+                for event in batch:
+                    try:
+                        write_events(connection, (event, ))
+                        self.written += 1
+                    except sqlite3.Error:
+                        self.rejected += 1
+
+        connection.close()
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def parse_event(line):
+    event = loads(line)
+    if (not isinstance(event, dict) or
+            not all(field in event for field in REQUIRED_EVENT_FIELDS)):
+
+        raise ValueError(f"Not a flag event: {line!r}")
+
+    for field in OPTIONAL_EVENT_FIELDS:
+        event.setdefault(field, None)
+
+    return event
+
+
+def open_database(database_path):
+    connection = sqlite3.connect(database_path)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def write_events(connection, events):
+    with connection:
+        connection.executemany(INSERT_EVENT, events)
+
+
+def import_spool(connection, spool_path):
+    # A server that crashed mid-write leaves a truncated last line behind
+    events = []
+    skipped = 0
+    with open(spool_path, errors='replace') as f:
+        for line in f:
+            if not line.strip():
+                continue
+
+            try:
+                events.append(parse_event(line))
+            except ValueError:
+                skipped += 1
+
+    write_events(connection, events)
+    return len(events), skipped
+
+
+def print_leaderboard(connection, limit):
+    rows = connection.execute(
+        "SELECT * FROM leaderboard LIMIT ?", (limit, )).fetchall()
+
+    print(f"{'Player':<24} {'Name':<24} {'Caps':>6} {'Steals':>6} "
+          f"{'Rets':>6} {'Drops':>6} {'Srvs':>4}")
+
+    for player, name, captures, steals, returns, drops, servers in rows:
+        print(f"{player:<24} {name or '':<24.24} {captures:>6} {steals:>6} "
+              f"{returns:>6} {drops:>6} {servers:>4}")
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(socket_path, database_path):
+    signal(SIGTERM, _raise_keyboard_interrupt)
+
+    events = Queue()
+
+    writer = StatsWriter(database_path, events)
+    writer.start()
+
+    with StatsServer(socket_path, events) as server:
+        print(f"Aggregating CTF stats from {socket_path} "
+              f"into {database_path}")
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+    # Don't let a repeated signal interrupt the final write
+    signal(SIGTERM, SIG_IGN)
+    os.remove(socket_path)
+
+    events.put(None)
+    writer.join()
+    print(f"Wrote {writer.written} events, rejected {writer.rejected}")
+
+
+def main():
+    parser = ArgumentParser(
+        description="Aggregate flag events from several CTF servers")
+
+    parser.add_argument(
+        "--database", default="ctf_stats.sqlite3",
+        help="SQLite database to keep the leaderboards in")
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_serve = subparsers.add_parser(
+        "serve", help="Receive events from plugin instances")
+    parser_serve.add_argument(
+        "--socket", default=STATS_SOCKET_PATH,
+        help="Unix domain socket to listen on")
+
+    parser_import = subparsers.add_parser(
+        "import", help="Import events spooled by a plugin instance")
+    parser_import.add_argument("spool_paths", nargs='+')
+
+    parser_leaderboard = subparsers.add_parser(
+        "leaderboard", help="Print the combined leaderboard")
+    parser_leaderboard.add_argument("--limit", type=int, default=20)
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.socket, args.database)
+        return
+
+    connection = open_database(args.database)
+    if args.command == "import":
+        for spool_path in args.spool_paths:
+            count, skipped = import_spool(connection, spool_path)
+            print(f"{spool_path}: imported {count} events, "
+                  f"skipped {skipped} malformed lines")
+
+    elif args.command == "leaderboard":
+        print_leaderboard(connection, args.limit)
+
+
+if __name__ == "__main__":
+    main()
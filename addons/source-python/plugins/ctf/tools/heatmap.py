@@ -0,0 +1,146 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+from argparse import ArgumentParser
+from configparser import ConfigParser
+from pathlib import Path
+
+# NumPy
+import numpy as np
+
+# CTF
+from ..core.telemetry import read_trail_header
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+# <game>/addons/source-python/plugins/ctf/tools/heatmap.py
+GAME_PATH = Path(__file__).resolve().parents[5]
+
+TEAM_NAMES = {
+    2: 'red',
+    3: 'blue',
+}
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def get_server_file(path):
+    server_path = path.with_name(path.stem + "_server" + path.suffix)
+    if server_path.is_file():
+        return server_path
+    return path
+
+
+def vector_from_str(str_):
+    return tuple(map(lambda x: float(x.strip()), str_.split(',')))
+
+
+def load_map_points(path_ini):
+    config = ConfigParser()
+    with open(path_ini, 'r') as f:
+        config.read_file(f)
+
+    return np.array([
+        vector_from_str(config[section][key])
+        for section in ('red_flag', 'blue_flag')
+        for key in ('origin', 'capture_zone_point1', 'capture_zone_point2')
+    ], dtype=np.float32)
+
+
+def load_trails(map_telemetry_path):
+    trails = {team: [] for team in TEAM_NAMES}
+    for path in sorted(map_telemetry_path.glob("*.bin")):
+        with open(path, 'rb') as f:
+            team, count = read_trail_header(f)
+            samples = np.fromfile(f, dtype='<f4', count=count * 3)
+
+        trails[team].append(samples.reshape(-1, 3))
+
+    return {
+        team: (np.concatenate(samples) if samples else
+               np.empty((0, 3), dtype=np.float32))
+        for team, samples in trails.items()
+    }
+
+
+def build_edges(points, cell_size):
+    mins = np.floor(points.min(axis=0) / cell_size) * cell_size
+    maxs = (np.floor(points.max(axis=0) / cell_size) + 1) * cell_size
+    return [
+        np.arange(mins[i], maxs[i] + cell_size / 2, cell_size)
+        for i in range(3)
+    ]
+
+
+def build_heatmaps(map_name, mapdata_path, telemetry_path, cell_size):
+    trails = load_trails(telemetry_path / map_name)
+
+    # Map points keep the grid stable between runs with different corpora
+    points = [load_map_points(
+        get_server_file(mapdata_path / f"{map_name}.ini"))]
+    points.extend(samples for samples in trails.values() if len(samples))
+    edges = build_edges(np.concatenate(points), cell_size)
+
+    result = {
+        'edges_x': edges[0],
+        'edges_y': edges[1],
+        'edges_z': edges[2],
+    }
+    for team, samples in trails.items():
+        team_name = TEAM_NAMES[team]
+        result[f'{team_name}_samples'] = np.array(len(samples))
+        result[f'{team_name}_2d'] = np.histogram2d(
+            samples[:, 0], samples[:, 1], bins=edges[:2])[0]
+
+        result[f'{team_name}_3d'] = np.histogramdd(samples, bins=edges)[0]
+
+    return result
+
+
+def main():
+    parser = ArgumentParser(
+        description="Bin CTF carrier telemetry into per-map heatmaps")
+
+    parser.add_argument(
+        "--game-path", type=Path, default=GAME_PATH,
+        help="Game directory containing mapdata/ and logs/")
+    parser.add_argument(
+        "--cell-size", type=float, default=64.0,
+        help="Heatmap cell size in world units")
+    parser.add_argument(
+        "--output", type=Path, default=Path("heatmaps"),
+        help="Directory to write <map>.npz files to")
+    parser.add_argument(
+        "maps", nargs='*',
+        help="Map names to process (default: every map in mapdata)")
+
+    args = parser.parse_args()
+
+    mapdata_path = args.game_path / "mapdata" / "ctf"
+    telemetry_path = (
+        args.game_path / "logs" / "source-python" / "ctf" / "telemetry")
+
+    map_names = args.maps or sorted(
+        path.stem for path in mapdata_path.glob("*.ini")
+        if not path.stem.endswith("_server"))
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    for map_name in map_names:
+        if not (telemetry_path / map_name).is_dir():
+            print(f"{map_name}: no telemetry, skipping")
+            continue
+
+        result = build_heatmaps(
+            map_name, mapdata_path, telemetry_path, args.cell_size)
+
+        np.savez_compressed(args.output / f"{map_name}.npz", **result)
+        print(f"{map_name}: {int(result['red_samples'])} red, "
+              f"{int(result['blue_samples'])} blue samples")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,494 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+from argparse import ArgumentParser
+from collections import defaultdict, namedtuple
+from itertools import product
+from json import dump, loads
+from multiprocessing import Pool
+from random import Random
+import sqlite3
+
+# CTF
+from ..core.rules import FlagState, FlagTeam, enemy_team, next_flag_state
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+Rules = namedtuple('Rules', (
+    'caps_to_win',
+    'dropped_flag_return_timeout',
+    'team_can_return_flag',
+    'capping_requires_flag_at_base',
+))
+
+# Mean times are in seconds, rates are per second
+Behaviour = namedtuple('Behaviour', (
+    'steal_rate',
+    'carry_time',
+    'carrier_lifetime',
+    'pickup_rate',
+    'team_return_rate',
+))
+
+# Unresolved rounds were cut short by the recording before the variant
+# decided them, so they count as neither wins nor stalemates
+RoundResult = namedtuple(
+    'RoundResult', ('length', 'winner', 'captures', 'resolved'))
+
+RecordedRound = namedtuple(
+    'RecordedRound', ('started_at', 'ended_at', 'events'))
+
+PERCENTILES = (10, 50, 90, 99)
+HISTOGRAM_BUCKET = 60
+ROUND_EVENTS = ('round_start', 'round_end')
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class SimulatedRound:
+    def __init__(self, rules, started_at):
+        self.rules = rules
+        self.started_at = started_at
+
+        self.states = {team: FlagState.AT_BASE for team in FlagTeam}
+        self.carriers = {team: None for team in FlagTeam}
+        self.dropped_at = {team: 0 for team in FlagTeam}
+        self.points = {team: 0 for team in FlagTeam}
+        self.winner = None
+        self.ended_at = None
+
+    def _transition(self, flag, transition):
+        try:
+            self.states[flag] = next_flag_state(self.states[flag], transition)
+        except ValueError:
+            return False
+
+        return True
+
+    def next_timeout(self):
+        timeout = self.rules.dropped_flag_return_timeout
+        if timeout < 0:
+            return None
+
+        return min((
+            self.dropped_at[flag] + timeout for flag in FlagTeam
+            if self.states[flag] == FlagState.DROPPED
+        ), default=None)
+
+    def advance(self, now):
+        timeout = self.rules.dropped_flag_return_timeout
+        if timeout < 0:
+            return
+
+        for flag in FlagTeam:
+            if (self.states[flag] == FlagState.DROPPED and
+                    self.dropped_at[flag] + timeout <= now):
+
+                self._transition(flag, 'return')
+
+    def steal(self, flag, player, now):
+        if not self._transition(flag, 'steal'):
+            return False
+
+        self.carriers[flag] = player
+        return True
+
+    def drop(self, flag, player, now):
+        if self.carriers[flag] != player:
+            return False
+
+        self._transition(flag, 'drop')
+        self.carriers[flag] = None
+        self.dropped_at[flag] = now
+        return True
+
+    def return_(self, flag, now):
+        if not self.rules.team_can_return_flag:
+            return False
+
+        return self._transition(flag, 'return')
+
+    def capture(self, flag, player, now):
+        if self.carriers[flag] != player:
+            return False
+
+        team = enemy_team(flag)
+        if (self.rules.capping_requires_flag_at_base and
+                self.states[team] != FlagState.AT_BASE):
+
+            return False
+
+        self._transition(flag, 'capture')
+        self.carriers[flag] = None
+
+        self.points[team] += 1
+        if self.points[team] >= self.rules.caps_to_win:
+            self.winner = team
+            self.ended_at = now
+
+        return True
+
+    def result(self, now, resolved=True):
+        return RoundResult(
+            (self.ended_at or now) - self.started_at,
+            None if self.winner is None else self.winner.name.lower(),
+            sum(self.points.values()),
+            resolved,
+        )
+
+    def close(self, now, round_time):
+        # A round that outlived round_time is a stalemate, anything shorter
+        # was still undecided when the recorded round ended
+        deadline = self.started_at + round_time
+        if now < deadline:
+            return self.result(now, resolved=False)
+
+        self.advance(deadline)
+        return self.result(deadline)
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def simulate_round(rules, behaviour, round_time, rng):
+    round_ = SimulatedRound(rules, 0)
+    now = 0
+    while round_.winner is None:
+        # Every team-level action that can happen right now and its rate
+        actions = []
+        for flag in FlagTeam:
+            state = round_.states[flag]
+            if state == FlagState.AT_BASE:
+                actions.append((behaviour.steal_rate, 'steal', flag))
+
+            elif state == FlagState.STOLEN:
+                actions.append((1 / behaviour.carry_time, 'capture', flag))
+                actions.append(
+                    (1 / behaviour.carrier_lifetime, 'drop', flag))
+
+            elif state == FlagState.DROPPED:
+                actions.append((behaviour.pickup_rate, 'steal', flag))
+                if rules.team_can_return_flag:
+                    actions.append(
+                        (behaviour.team_return_rate, 'return', flag))
+
+        total_rate = sum(rate for rate, _, _ in actions)
+        if total_rate > 0:
+            next_action_at = now + rng.expovariate(total_rate)
+        else:
+            next_action_at = float('inf')
+
+        # Actions are memoryless, so an earlier timeout can pre-empt them
+        timeout_at = round_.next_timeout()
+        if timeout_at is not None and timeout_at <= next_action_at:
+            now = timeout_at
+            round_.advance(now)
+            continue
+
+        if next_action_at >= round_time:
+            return round_.result(round_time)
+
+        now = next_action_at
+        pick = rng.random() * total_rate
+        for rate, transition, flag in actions:
+            pick -= rate
+            if pick <= 0:
+                break
+
+        carrier = enemy_team(flag)
+        if transition == 'steal':
+            round_.steal(flag, carrier, now)
+        elif transition == 'drop':
+            round_.drop(flag, carrier, now)
+        elif transition == 'return':
+            round_.return_(flag, now)
+        elif transition == 'capture':
+            round_.capture(flag, carrier, now)
+
+    return round_.result(now)
+
+
+def split_rounds(events, idle_gap):
+    # Rounds follow the streamed round markers; logs without them are split
+    # wherever the server went quiet for idle_gap seconds, and the quiet time
+    # is skipped
+    has_markers = any(event['event'] in ROUND_EVENTS for event in events)
+
+    rounds = []
+    round_events = None
+    started_at = last_event_at = None
+    for event in events:
+        now = event['time']
+        if has_markers:
+            if event['event'] in ROUND_EVENTS:
+                if round_events is not None:
+                    rounds.append(RecordedRound(started_at, now, round_events))
+
+                round_events = None
+                if event['event'] == 'round_start':
+                    round_events = []
+                    started_at = last_event_at = now
+
+                continue
+
+            # Events outside of a recorded round are ignored
+            if round_events is None:
+                continue
+
+        elif round_events is None or now - last_event_at >= idle_gap:
+            if round_events is not None:
+                rounds.append(
+                    RecordedRound(started_at, last_event_at, round_events))
+
+            round_events = []
+            started_at = now
+
+        round_events.append(event)
+        last_event_at = now
+
+    if round_events is not None:
+        rounds.append(RecordedRound(started_at, last_event_at, round_events))
+
+    return rounds
+
+
+def replay_round(rules, recorded_round, round_time):
+    # Recorded events are replayed as player intentions; the variant's rules
+    # decide which of them still go through. Whatever happens after the
+    # variant has decided the round is ignored.
+    round_ = SimulatedRound(rules, recorded_round.started_at)
+    for event in recorded_round.events:
+        now = event['time']
+        if now - round_.started_at >= round_time:
+            break
+
+        round_.advance(now)
+
+        flag = FlagTeam[event['flag'].upper()]
+        player = event['player']
+        if event['event'] == 'steal':
+            round_.steal(flag, player, now)
+        elif event['event'] == 'drop':
+            round_.drop(flag, player, now)
+        elif event['event'] == 'return' and player is not None:
+            round_.return_(flag, now)
+        elif event['event'] == 'capture':
+            round_.capture(flag, player, now)
+
+        if round_.winner is not None:
+            return round_.result(now)
+
+    return round_.close(recorded_round.ended_at, round_time)
+
+
+def load_logs(path):
+    logs = defaultdict(list)
+    if path.endswith((".sqlite3", ".db")):
+        connection = sqlite3.connect(path)
+        rows = connection.execute(
+            "SELECT server, map, time, flag, event, player FROM events "
+            "ORDER BY time, id")
+
+        for server, map_name, time, flag, event, player in rows:
+            logs[server, map_name].append({
+                'time': time,
+                'flag': flag,
+                'event': event,
+                'player': player,
+            })
+
+        connection.close()
+
+    else:
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    event = loads(line)
+                    logs[event['server'], event['map']].append(event)
+
+    for events in logs.values():
+        events.sort(key=lambda event: event['time'])
+
+    return list(logs.values())
+
+
+def run_replay_task(task):
+    # Every variant replays the same chunk of recorded rounds, so the logs
+    # are only sent to a worker once per chunk
+    variants, recorded_rounds, round_time = task
+    return [
+        (rules, [
+            replay_round(rules, recorded_round, round_time)
+            for recorded_round in recorded_rounds
+        ])
+        for rules in variants
+    ]
+
+
+def run_simulation_task(task):
+    rules, behaviour, seed, rounds, round_time = task
+    rng = Random(seed)
+    return [(rules, [
+        simulate_round(rules, behaviour, round_time, rng)
+        for _ in range(rounds)
+    ])]
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0
+
+    index = round(percent / 100 * (len(sorted_values) - 1))
+    return sorted_values[index]
+
+
+def summarize(results):
+    unresolved = sum(1 for result in results if not result.resolved)
+    results = [result for result in results if result.resolved]
+
+    lengths = sorted(result.length for result in results)
+    stalemates = [result for result in results if result.winner is None]
+
+    histogram = defaultdict(int)
+    for length in lengths:
+        histogram[int(length // HISTOGRAM_BUCKET) * HISTOGRAM_BUCKET] += 1
+
+    stalemate_scores = defaultdict(int)
+    for result in stalemates:
+        stalemate_scores[result.captures] += 1
+
+    return {
+        'rounds': len(results),
+        'unresolved': unresolved,
+        'stalemates': len(stalemates),
+        'stalemate_rate': len(stalemates) / len(results) if results else 0,
+        'length_mean': sum(lengths) / len(lengths) if lengths else 0,
+        'length_percentiles': {
+            percent: percentile(lengths, percent) for percent in PERCENTILES},
+        'length_histogram': dict(sorted(histogram.items())),
+        'stalemate_captures': dict(sorted(stalemate_scores.items())),
+        'red_wins': sum(1 for result in results if result.winner == 'red'),
+        'blue_wins': sum(1 for result in results if result.winner == 'blue'),
+    }
+
+
+def print_summaries(summaries):
+    print(f"{'Caps':>4} {'Timeout':>7} {'TeamRet':>7} {'AtBase':>6} "
+          f"{'Rounds':>7} {'Unres':>6} {'Stale%':>6} {'Mean':>7} " +
+          " ".join(f"{'p' + str(percent):>7}" for percent in PERCENTILES))
+
+    for rules, summary in summaries:
+        print(
+            f"{rules.caps_to_win:>4} "
+            f"{rules.dropped_flag_return_timeout:>7g} "
+            f"{rules.team_can_return_flag:>7} "
+            f"{rules.capping_requires_flag_at_base:>6} "
+            f"{summary['rounds']:>7} "
+            f"{summary['unresolved']:>6} "
+            f"{summary['stalemate_rate'] * 100:>6.1f} "
+            f"{summary['length_mean']:>7.1f} " +
+            " ".join(
+                f"{summary['length_percentiles'][percent]:>7.1f}"
+                for percent in PERCENTILES)
+        )
+
+
+def main():
+    parser = ArgumentParser(
+        description="Replay or simulate CTF rounds under alternative rules")
+
+    parser.add_argument(
+        "logs", nargs='*',
+        help="Event logs (JSON lines or aggregator databases) to replay; "
+             "synthetic rounds are generated if none are given")
+
+    parser.add_argument("--caps-to-win", type=int, nargs='+', default=[3])
+    parser.add_argument(
+        "--return-timeout", type=float, nargs='+', default=[45.0])
+    parser.add_argument(
+        "--team-can-return", type=int, nargs='+', default=[0])
+    parser.add_argument(
+        "--requires-flag-at-base", type=int, nargs='+', default=[0])
+    parser.add_argument(
+        "--round-time", type=float, default=600.0,
+        help="Round length at which the round counts as a stalemate")
+    parser.add_argument(
+        "--idle-gap", type=float, default=120.0,
+        help="Quiet time that ends a round in logs without round markers")
+
+    parser.add_argument("--rounds", type=int, default=10000)
+    parser.add_argument(
+        "--chunk-size", type=int, default=500,
+        help="Rounds per worker task")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--steal-rate", type=float, default=1 / 40)
+    parser.add_argument("--carry-time", type=float, default=30.0)
+    parser.add_argument("--carrier-lifetime", type=float, default=25.0)
+    parser.add_argument("--pickup-rate", type=float, default=1 / 15)
+    parser.add_argument("--team-return-rate", type=float, default=1 / 10)
+
+    parser.add_argument(
+        "--processes", type=int, default=None,
+        help="Worker processes (default: one per CPU)")
+    parser.add_argument("--json", help="Write full summaries to this file")
+
+    args = parser.parse_args()
+
+    variants = [
+        Rules(*values) for values in product(
+            args.caps_to_win, args.return_timeout,
+            args.team_can_return, args.requires_flag_at_base)
+    ]
+
+    if args.logs:
+        # Logs are read once, the rounds in them are spread over the pool
+        recorded_rounds = [
+            recorded_round
+            for path in args.logs
+            for events in load_logs(path)
+            for recorded_round in split_rounds(events, args.idle_gap)
+        ]
+
+        run_task = run_replay_task
+        tasks = [
+            (variants, recorded_rounds[start:start + args.chunk_size],
+             args.round_time)
+            for start in range(0, len(recorded_rounds), args.chunk_size)
+        ]
+
+    else:
+        behaviour = Behaviour(
+            args.steal_rate, args.carry_time, args.carrier_lifetime,
+            args.pickup_rate, args.team_return_rate)
+
+        run_task = run_simulation_task
+        tasks = [
+            (rules, behaviour, args.seed + start,
+             min(args.chunk_size, args.rounds - start), args.round_time)
+            for rules in variants
+            for start in range(0, args.rounds, args.chunk_size)
+        ]
+
+    results = defaultdict(list)
+    with Pool(args.processes) as pool:
+        for task_results in pool.imap_unordered(run_task, tasks):
+            for rules, rules_results in task_results:
+                results[rules].extend(rules_results)
+
+    summaries = [(rules, summarize(results[rules])) for rules in variants]
+    print_summaries(summaries)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            dump([
+                {'rules': rules._asdict(), **summary}
+                for rules, summary in summaries
+            ], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+from argparse import ArgumentParser
+from collections import defaultdict
+from configparser import ConfigParser
+import gc
+from importlib import import_module
+from json import dumps
+from multiprocessing import Process, Queue
+from pathlib import Path
+from queue import Empty
+from random import Random
+import resource
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import perf_counter
+from traceback import format_exc
+
+# CTF
+from ..core.hooktrace import HookTraceKind, read_hook_trace
+from ..core.rules import FlagTeam
+from .sp_standins import FLOOR_Z, USERID_OFFSET, Vector, World, install
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+# <game>/addons/source-python/plugins/ctf/tools/soak.py
+GAME_PATH = Path(__file__).resolve().parents[5]
+
+LATENCY_PERCENTILES = (50, 99, 99.9)
+MAX_REPORTED_ERRORS = 5
+
+HOOK_CLASSNAMES = {
+    HookTraceKind.FLAG_TOUCH: 'prop_dynamic_glow',
+    HookTraceKind.ZONE_TOUCH: 'trigger_multiple',
+}
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class SoakServer:
+    def __init__(self, args, server_id, log_path):
+        self.args = args
+        self.server_id = server_id
+
+        cvars = dict(cvar.split('=', 1) for cvar in args.cvar)
+        self.world = World(args.game_path, log_path, args.players, cvars)
+
+        install(self.world)
+
+        # Imported only now, so that it picks up the stand-ins
+        self.plugin = import_module('ctf.ctf')
+        self.plugin.time = self.world.time
+
+        self.world.global_vars.map_name = args.map
+        self.plugin.load()
+        self.world.fire_level_init(args.map)
+
+        self.bounds = load_map_bounds(args.game_path, args.map)
+        self.rng = Random(args.seed + server_id)
+
+        for index in range(1, args.players + 1):
+            self.world.connect(
+                index, FlagTeam.RED if index % 2 else FlagTeam.BLUE)
+
+        self.latencies = defaultdict(list)
+        self.events = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def dispatch(self, kind, flag_team, player_team, player_index):
+        world = self.world
+        if player_index:
+            if player_index not in world.players:
+                world.connect(player_index, player_team)
+            elif player_team:
+                world.players[player_index].team = player_team
+
+        if kind == HookTraceKind.ROUND_START:
+            world.clean_up_map()
+            world.fire_event('round_start')
+
+        elif kind == HookTraceKind.ROUND_END:
+            world.fire_event('round_end')
+
+        elif kind == HookTraceKind.PLAYER_DEATH:
+            world.players[player_index].origin = self.random_origin()
+            world.fire_event(
+                'player_death', userid=USERID_OFFSET + player_index)
+
+        else:
+            flag = self.plugin._flags.get(flag_team)
+            if flag is None:
+                entity_index = world.max_clients + 1
+            elif kind == HookTraceKind.FLAG_TOUCH:
+                entity_index = flag.entity_index
+            else:
+                entity_index = flag.capture_zone_entity_index
+
+            # The flag is being carried, so there's nothing to touch
+            if entity_index == -1:
+                self.skipped += 1
+                return
+
+            world.touch(HOOK_CLASSNAMES[kind], entity_index, player_index)
+
+    def random_origin(self):
+        mins, maxs = self.bounds
+        return Vector(
+            self.rng.uniform(mins[0], maxs[0]),
+            self.rng.uniform(mins[1], maxs[1]),
+            FLOOR_Z + 64,
+        )
+
+    def replay(self, records, reports):
+        errors_reported = 0
+        window_started_at = perf_counter()
+        window_end = self.args.report_interval
+        window_events = 0
+
+        duration = self.args.duration
+        for time, kind, flag_team, player_team, player_index in records:
+            if time >= duration:
+                break
+
+            while time >= window_end:
+                self.world.run_until(window_end)
+                reports.put(self.report(
+                    window_end, window_events,
+                    perf_counter() - window_started_at))
+
+                window_started_at = perf_counter()
+                window_end += self.args.report_interval
+                window_events = 0
+
+            self.world.run_until(time)
+
+            started_at = perf_counter()
+            try:
+                self.dispatch(kind, flag_team, player_team, player_index)
+            except Exception:
+                self.errors += 1
+                if errors_reported < MAX_REPORTED_ERRORS:
+                    errors_reported += 1
+                    reports.put({'server': self.server_id,
+                                 'error': format_exc()})
+
+            self.latencies[HookTraceKind(kind).name].append(
+                perf_counter() - started_at)
+
+            self.events += 1
+            window_events += 1
+
+        # The last window may be shorter than the report interval
+        window_start = window_end - self.args.report_interval
+        if duration > window_start:
+            self.world.run_until(duration)
+            reports.put(self.report(
+                duration, window_events, perf_counter() - window_started_at,
+                duration - window_start))
+
+    def report(self, now, window_events, window_wall_time,
+               window_length=None):
+
+        if window_length is None:
+            window_length = self.args.report_interval
+
+        plugin = self.plugin
+        report = {
+            'server': self.server_id,
+            'time': now,
+            'events': window_events,
+            'events_per_second': window_events / window_wall_time,
+            'speedup': window_length / window_wall_time,
+            'errors': self.errors,
+            'callback_errors': self.world.callback_errors,
+            'skipped': self.skipped,
+            'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'gc_objects': len(gc.get_objects()),
+            'ecx_storage_start_touch_flags': len(
+                plugin._ecx_storage_start_touch_flags),
+            'ecx_storage_start_touch_zones': len(
+                plugin._ecx_storage_start_touch_zones),
+            'entities': len(self.world.entities),
+            'ctfplayers': len(plugin.ctfplayers),
+            'pending_tasks': self.world.pending_tasks,
+            'transitions': sum(
+                value for _, _, value in plugin.flag_transitions.samples()),
+            'latency_us': {},
+        }
+
+        for kind, latencies in self.latencies.items():
+            latencies.sort()
+            report['latency_us'][kind] = {
+                f"p{percent}": latencies[min(
+                    len(latencies) - 1,
+                    int(percent / 100 * len(latencies)))] * 1e6
+                for percent in LATENCY_PERCENTILES
+            }
+            report['latency_us'][kind]['max'] = latencies[-1] * 1e6
+
+        self.latencies.clear()
+
+        report['callback_tracebacks'] = self.world.callback_tracebacks[:]
+        self.world.callback_tracebacks.clear()
+        return report
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def load_map_bounds(game_path, map_name):
+    config = ConfigParser()
+    config.read(game_path / "mapdata" / "ctf" / f"{map_name}.ini")
+
+    points = [
+        tuple(map(float, config[section][key].split(',')))
+        for section in ('red_flag', 'blue_flag')
+        for key in ('origin', 'capture_zone_point1', 'capture_zone_point2')
+    ]
+    return tuple(map(min, *points)), tuple(map(max, *points))
+
+
+def looped_trace(records, duration):
+    if not records:
+        return
+
+    trace_length = records[-1][0] + 1
+    offset = 0
+    while offset < duration:
+        for time, *fields in records:
+            yield (offset + time, *fields)
+
+        offset += trace_length
+
+
+def synthetic_trace(server, args):
+    # Touches and deaths at the configured rates, with a share of the zone
+    # touches made by flag carriers so that captures actually happen
+    rng = Random(args.seed + server.server_id)
+    flags = server.plugin._flags
+    total_rate = args.touch_rate + args.death_rate
+
+    time = 0
+    round_started_at = 0
+    yield time, HookTraceKind.ROUND_START, 0, 0, 0
+
+    while True:
+        time += rng.expovariate(total_rate)
+        if time - round_started_at >= args.round_length:
+            round_started_at = time
+            yield time, HookTraceKind.ROUND_END, 0, 0, 0
+            yield time, HookTraceKind.ROUND_START, 0, 0, 0
+            continue
+
+        player_index = rng.randint(1, args.players)
+        player_team = server.world.players[player_index].team
+        if rng.random() * total_rate < args.death_rate:
+            yield (time, HookTraceKind.PLAYER_DEATH, 0, player_team,
+                   player_index)
+
+            continue
+
+        flag_team = rng.choice((FlagTeam.RED, FlagTeam.BLUE))
+        carrier = flags[flag_team].ctfplayer if flag_team in flags else None
+        if carrier is not None and rng.random() < 0.5:
+            yield (time, HookTraceKind.ZONE_TOUCH, flag_team,
+                   carrier.player.team, carrier.index)
+
+        else:
+            yield (time, HookTraceKind.FLAG_TOUCH, flag_team, player_team,
+                   player_index)
+
+
+def run_server(args, server_id, reports):
+    log_path = args.log_path or mkdtemp(prefix="ctf-soak-")
+    server = None
+    try:
+        if args.trace:
+            _, records = read_hook_trace(args.trace)
+
+            # The recording server may have had more slots than asked for
+            args.players = max(
+                [args.players] + [record[4] for record in records])
+
+            server = SoakServer(args, server_id, log_path)
+            records = looped_trace(records, args.duration)
+
+        else:
+            server = SoakServer(args, server_id, log_path)
+            records = synthetic_trace(server, args)
+
+        server.replay(records, reports)
+        server.plugin.unload()
+
+    except Exception:
+        reports.put({'server': server_id, 'error': format_exc()})
+
+    finally:
+        if not args.log_path:
+            rmtree(log_path, ignore_errors=True)
+
+        # main() waits for this from every worker
+        reports.put({
+            'server': server_id,
+            'done': True,
+            'events': 0 if server is None else server.events,
+        })
+
+
+def print_report(report):
+    latencies = " ".join(
+        f"{kind.lower()}={values['p99']:.0f}/{values['max']:.0f}"
+        for kind, values in sorted(report['latency_us'].items()))
+
+    print(
+        f"[{report['server']}] t={report['time'] / 3600:.2f}h "
+        f"{report['events_per_second']:.0f} ev/s "
+        f"x{report['speedup']:.0f} "
+        f"rss={report['maxrss_kb'] / 1024:.1f}MB "
+        f"objs={report['gc_objects']} "
+        f"ecx={report['ecx_storage_start_touch_flags']}/"
+        f"{report['ecx_storage_start_touch_zones']} "
+        f"ents={report['entities']} "
+        f"tasks={report['pending_tasks']} "
+        f"errors={report['errors']}/{report['callback_errors']} "
+        f"p99/max us: {latencies}"
+    )
+
+
+def main():
+    parser = ArgumentParser(
+        description="Replay recorded or synthetic hook traffic against the "
+                    "CTF plugin using Source.Python stand-ins")
+
+    parser.add_argument(
+        "trace", nargs='?',
+        help="Hook trace recorded with ctf_trace_hooks 1 "
+             "(default: synthetic traffic)")
+
+    parser.add_argument("--game-path", type=Path, default=GAME_PATH)
+    parser.add_argument("--map", default="breakfloor_4096")
+    parser.add_argument("--players", type=int, default=64)
+    parser.add_argument(
+        "--servers", type=int, default=1,
+        help="Plugin instances to run in parallel, each with its own flags")
+    parser.add_argument(
+        "--duration", type=float, default=4 * 3600,
+        help="Simulated seconds to replay; traces are looped to fill it")
+    parser.add_argument(
+        "--report-interval", type=float, default=600,
+        help="Simulated seconds between reports")
+    parser.add_argument("--touch-rate", type=float, default=200.0)
+    parser.add_argument("--death-rate", type=float, default=2.0)
+    parser.add_argument("--round-length", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--cvar", action='append', default=[],
+        help="Override a plugin cvar, e.g. --cvar caps_to_win=5")
+    parser.add_argument("--json", help="Write every report to this file")
+    parser.add_argument(
+        "--log-path",
+        help="Keep the plugin's logs and traces here "
+             "(default: a temporary directory that is removed afterwards)")
+
+    args = parser.parse_args()
+
+    if args.trace:
+        map_name, _ = read_hook_trace(args.trace)
+        args.map = map_name
+
+    reports = Queue()
+    processes = [
+        Process(target=run_server, args=(args, server_id, reports))
+        for server_id in range(args.servers)
+    ]
+    for process in processes:
+        process.start()
+
+    json_file = open(args.json, 'w') if args.json else None
+    running = set(range(len(processes)))
+    while running:
+        try:
+            report = reports.get(timeout=1.0)
+        except Empty:
+            # A worker that died without saying so is not waited for
+            for server_id in list(running):
+                if not processes[server_id].is_alive():
+                    print(f"[{server_id}] exited with code "
+                          f"{processes[server_id].exitcode}")
+
+                    running.discard(server_id)
+
+            continue
+
+        if 'error' in report:
+            print(f"[{report['server']}] error:\n{report['error']}")
+        elif 'done' in report:
+            print(f"[{report['server']}] done, {report['events']} events")
+            running.discard(report['server'])
+        else:
+            print_report(report)
+            for callback_traceback in report['callback_tracebacks']:
+                print(f"[{report['server']}] callback error:\n"
+                      f"{callback_traceback}")
+
+        if json_file is not None:
+            json_file.write(dumps(report) + "\n")
+
+    for process in processes:
+        process.join()
+
+    if json_file is not None:
+        json_file.close()
+
+
+if __name__ == "__main__":
+    main()
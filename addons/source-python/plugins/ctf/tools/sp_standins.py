@@ -0,0 +1,581 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+from configparser import ConfigParser
+from enum import IntEnum
+from heapq import heappop, heappush
+from itertools import count
+from pathlib import Path
+import sys
+from threading import Thread
+from traceback import format_exc
+from types import ModuleType, SimpleNamespace
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+SERVER_PORT = 27015
+FLOOR_Z = 768.0
+USERID_OFFSET = 1000
+MAX_KEPT_TRACEBACKS = 5
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class SPPath(type(Path())):
+    # The subset of path.py's API the plugin relies on
+    def isfile(self):
+        return self.is_file()
+
+    def dirname(self):
+        return self.parent
+
+    @property
+    def namebase(self):
+        return self.stem
+
+    @property
+    def ext(self):
+        return self.suffix
+
+    def makedirs_p(self):
+        self.mkdir(parents=True, exist_ok=True)
+
+    def remove(self):
+        self.unlink()
+
+
+class Vector:
+    __slots__ = ('x', 'y', 'z')
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x, self.y, self.z = x, y, z
+
+    def __repr__(self):
+        return f"Vector({self.x}, {self.y}, {self.z})"
+
+    def __add__(self, other):
+        return Vector(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def __sub__(self, other):
+        return Vector(self.x - other.x, self.y - other.y, self.z - other.z)
+
+    def __mul__(self, scalar):
+        return Vector(self.x * scalar, self.y * scalar, self.z * scalar)
+
+    def __truediv__(self, scalar):
+        return Vector(self.x / scalar, self.y / scalar, self.z / scalar)
+
+    def __eq__(self, other):
+        return (self.x, self.y, self.z) == (other.x, other.y, other.z)
+
+
+class Color:
+    def __init__(self, r=255, g=255, b=255, a=255):
+        self.r, self.g, self.b, self.a = r, g, b, a
+
+
+class RepeatStatus(IntEnum):
+    STOPPED = 1
+    RUNNING = 2
+    PAUSED = 3
+
+
+# Game state and clock shared by every stand-in module
+class World:
+    def __init__(self, game_path, log_path, max_clients, cvars=None):
+        self.game_path = SPPath(game_path)
+        self.log_path = SPPath(log_path)
+        self.max_clients = max_clients
+        self.cvars = cvars or {}
+        self.clock = 0.0
+
+        self.global_vars = SimpleNamespace(
+            map_name=None, max_clients=max_clients)
+
+        self.players = {}
+        self.player_dictionaries = []
+        self.entities = {}
+        self.free_indexes = []
+        self.next_index = max_clients + 1
+
+        self.hooks = {}
+        self.events = {}
+        self.say_commands = {}
+        self.level_init_listeners = []
+
+        self.tasks = []
+        self.task_ids = count()
+
+        self.messages_sent = 0
+        self.sounds_played = 0
+        self.win_conditions = []
+
+        self.callback_errors = 0
+        self.callback_tracebacks = []
+
+        self._stack_addresses = count(1)
+
+    def time(self):
+        return self.clock
+
+    def callback_failed(self):
+        # Like Source.Python, a failing Delay or Repeat is only reported
+        self.callback_errors += 1
+        if len(self.callback_tracebacks) < MAX_KEPT_TRACEBACKS:
+            self.callback_tracebacks.append(format_exc())
+
+    # Scheduler
+    def schedule(self, delay, task):
+        heappush(self.tasks, (self.clock + delay, next(self.task_ids), task))
+
+    def run_until(self, until):
+        while self.tasks and self.tasks[0][0] <= until:
+            due, _, task = heappop(self.tasks)
+            self.clock = max(self.clock, due)
+            task.fire()
+
+        self.clock = max(self.clock, until)
+
+    @property
+    def pending_tasks(self):
+        return sum(1 for _, _, task in self.tasks if task.running)
+
+    # Players
+    def connect(self, index, team, name=None):
+        self.players[index] = SimpleNamespace(
+            team=team,
+            name=name or f"Player {index}",
+            origin=Vector(0, 0, FLOOR_Z),
+            steamid=f"STEAM_1:0:{index}",
+            userid=USERID_OFFSET + index,
+        )
+
+    def disconnect(self, index):
+        for dictionary in self.player_dictionaries:
+            if index in dictionary:
+                dictionary.on_automatically_removed(index)
+                del dictionary[index]
+
+        del self.players[index]
+
+    def index_from_userid(self, userid):
+        index = userid - USERID_OFFSET
+        if index not in self.players:
+            raise ValueError(f"Invalid userid: {userid}")
+
+        return index
+
+    # Entities
+    def allocate_entity(self, entity):
+        if self.free_indexes:
+            index = heappop(self.free_indexes)
+        else:
+            index = self.next_index
+            self.next_index += 1
+
+        self.entities[index] = entity
+        return index
+
+    def free_entity(self, index):
+        del self.entities[index]
+        heappush(self.free_indexes, index)
+
+    def clean_up_map(self):
+        # Like a round restart, removes every entity the plugin created
+        for index in list(self.entities.keys()):
+            self.free_entity(index)
+
+    # Callbacks
+    def fire_event(self, name, **fields):
+        for callback in self.events.get(name, ()):
+            callback(fields)
+
+    def fire_level_init(self, map_name):
+        self.global_vars.map_name = map_name
+        for callback in self.level_init_listeners:
+            callback(map_name)
+
+    def touch(self, classname, entity_index, other_index):
+        stack_data = StackData(
+            entity_index, other_index, next(self._stack_addresses))
+
+        for callback in self.hooks.get((classname, 'start_touch', 'pre'), ()):
+            callback(stack_data)
+
+        for callback in self.hooks.get(
+                (classname, 'start_touch', 'post'), ()):
+
+            callback(stack_data, None)
+
+
+class StackData:
+    def __init__(self, entity_index, other_index, address):
+        self._arguments = (entity_index, other_index)
+        self.registers = SimpleNamespace(esp=SimpleNamespace(
+            address=SimpleNamespace(address=address)))
+
+    def __getitem__(self, item):
+        return self._arguments[item]
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def _module(name, **attributes):
+    module = ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+
+def install(world):
+    # paths, core, plugins.manager
+    _module(
+        'paths',
+        GAME_PATH=world.game_path,
+        CFG_PATH=world.game_path / "cfg" / "source-python",
+        LOG_PATH=world.log_path,
+    )
+    _module('core', GAME_NAME='csgo', echo_console=print)
+    _module('plugins')
+    _module('plugins.manager', plugin_manager=SimpleNamespace(
+        get_plugin_info=lambda name: SimpleNamespace(
+            name=name.split('.')[0])))
+
+    # colors, mathlib, cvars
+    _module('colors', Color=Color)
+    _module('mathlib', Vector=Vector)
+
+    class ConVar:
+        def __init__(self, name):
+            self.name = name
+
+        def get_int(self):
+            return SERVER_PORT if self.name == 'hostport' else 0
+
+    _module('cvars', ConVar=ConVar)
+
+    # controlled_cvars
+    class InvalidValue(Exception):
+        pass
+
+    class StandInCvar:
+        def __init__(self, value):
+            self.value = value
+
+        def get_int(self):
+            return int(float(self.value))
+
+        def get_float(self):
+            return float(self.value)
+
+        def get_bool(self):
+            return bool(int(float(self.value)))
+
+        def get_string(self):
+            return str(self.value)
+
+    class Sound:
+        def __init__(self, path):
+            self.path = path
+
+        def play(self, *indexes):
+            world.sounds_played += 1
+
+    class ControlledConfigManager:
+        def __init__(self, filepath, cvar_prefix=''):
+            self._values = {}
+
+        def section(self, name):
+            pass
+
+        def controlled_cvar(self, handler, name, default, description=''):
+            self._values[name] = handler(
+                StandInCvar(world.cvars.get(name, default)))
+
+        def write(self):
+            pass
+
+        def execute(self):
+            pass
+
+        def __getitem__(self, name):
+            return self._values[name]
+
+    _module(
+        'controlled_cvars',
+        ControlledConfigManager=ControlledConfigManager,
+        InvalidValue=InvalidValue,
+    )
+    _module(
+        'controlled_cvars.handlers',
+        bool_handler=lambda cvar: cvar.get_bool(),
+        float_handler=lambda cvar: cvar.get_float(),
+        int_handler=lambda cvar: cvar.get_int(),
+        sound_nullable_handler=lambda cvar: Sound(cvar.get_string()),
+    )
+
+    # translations.strings
+    class TranslationStrings:
+        def __init__(self, key, tokens=None):
+            self.key = key
+            self.tokens = tokens or {}
+
+        def tokenized(self, **tokens):
+            return TranslationStrings(self.key, tokens)
+
+    class LangStrings(dict):
+        def __init__(self, infile):
+            super().__init__()
+
+            config = ConfigParser(interpolation=None)
+            config.read(
+                world.game_path / "resource" / "source-python" /
+                "translations" / f"{infile}.ini", encoding='utf-8')
+
+            for section in config.sections():
+                self[section] = TranslationStrings(section)
+
+    _module('translations')
+    _module('translations.strings', LangStrings=LangStrings)
+
+    # engines
+    _module('engines')
+    _module('engines.precache', Model=lambda path: path)
+    _module('engines.server', global_vars=world.global_vars)
+
+    class GameTrace:
+        def __init__(self):
+            self.end_position = None
+
+        def did_hit(self):
+            return self.end_position is not None
+
+    class EngineTrace:
+        def trace_ray(self, ray, mask, trace_filter, trace):
+            start = ray.start
+            trace.end_position = Vector(start.x, start.y, FLOOR_Z)
+
+    _module(
+        'engines.trace',
+        ContentMasks=SimpleNamespace(ALL=-1),
+        engine_trace=EngineTrace(),
+        GameTrace=GameTrace,
+        MAX_TRACE_LENGTH=56755.84,
+        Ray=lambda start, end: SimpleNamespace(start=start, end=end),
+        TraceFilterSimple=lambda *args: None,
+    )
+
+    # entities
+    class Entity:
+        def __init__(self, classname):
+            self.classname = classname
+            self.origin = Vector()
+            self.index = world.allocate_entity(self)
+
+        @classmethod
+        def create(cls, classname):
+            return cls(classname)
+
+        @classmethod
+        def find_or_create(cls, classname):
+            for entity in world.entities.values():
+                if entity.classname == classname:
+                    return entity
+
+            return cls(classname)
+
+        def remove(self):
+            world.free_entity(self.index)
+
+        def spawn(self):
+            pass
+
+        def teleport(self, origin=None, angle=None, velocity=None):
+            if origin is not None:
+                self.origin = origin
+
+        def set_key_value_int(self, name, value):
+            pass
+
+        def set_key_value_string(self, name, value):
+            pass
+
+        def fire_win_condition(self, condition):
+            world.win_conditions.append(condition)
+
+    def hook(stage):
+        def decorator_factory(classname, function_name):
+            def decorator(callback):
+                world.hooks.setdefault(
+                    (classname, function_name, stage), []).append(callback)
+
+                return callback
+
+            return decorator
+
+        return decorator_factory
+
+    _module('entities')
+    _module('entities.constants', SolidType=SimpleNamespace(
+        BBOX=2, VPHYSICS=6))
+    _module('entities.entity', Entity=Entity)
+    _module('entities.helpers', index_from_pointer=lambda pointer: pointer)
+    _module(
+        'entities.hooks',
+        EntityCondition=SimpleNamespace(
+            equals_entity_classname=lambda classname: classname),
+        EntityPreHook=hook('pre'),
+        EntityPostHook=hook('post'),
+    )
+
+    # events, commands, listeners
+    def registrar(registry):
+        def decorator_factory(*names):
+            def decorator(callback):
+                for name in names:
+                    if isinstance(name, (list, tuple)):
+                        for alias in name:
+                            registry.setdefault(alias, []).append(callback)
+                    else:
+                        registry.setdefault(name, []).append(callback)
+
+                return callback
+
+            return decorator
+
+        return decorator_factory
+
+    _module('events', Event=registrar(world.events))
+    _module('commands')
+    _module('commands.say', SayCommand=registrar(world.say_commands))
+
+    def on_level_init(callback):
+        world.level_init_listeners.append(callback)
+        return callback
+
+    class Delay:
+        def __init__(self, delay, callback, args=(), kwargs=None,
+                     cancel_on_level_end=False):
+
+            self.callback = callback
+            self.args = args
+            self.kwargs = kwargs or {}
+            self.running = True
+            world.schedule(max(delay, 0), self)
+
+        def fire(self):
+            if not self.running:
+                return
+
+            self.running = False
+            try:
+                self.callback(*self.args, **self.kwargs)
+            except Exception:
+                world.callback_failed()
+
+        def cancel(self):
+            self.running = False
+
+    class Repeat:
+        def __init__(self, callback):
+            self.callback = callback
+            self.status = RepeatStatus.STOPPED
+            self.interval = 0
+            self._generation = 0
+
+        def start(self, interval, limit=0, execute_on_start=False):
+            self.interval = interval
+            self.status = RepeatStatus.RUNNING
+            self._generation += 1
+            world.schedule(interval, _RepeatTick(self, self._generation))
+
+        def stop(self):
+            self.status = RepeatStatus.STOPPED
+            self._generation += 1
+
+        def __call__(self, *args, **kwargs):
+            return self.callback(*args, **kwargs)
+
+    class _RepeatTick:
+        def __init__(self, repeat, generation):
+            self.repeat = repeat
+            self.generation = generation
+
+        @property
+        def running(self):
+            return self.generation == self.repeat._generation
+
+        def fire(self):
+            if not self.running:
+                return
+
+            world.schedule(self.repeat.interval, self)
+            try:
+                self.repeat.callback()
+            except Exception:
+                world.callback_failed()
+
+    _module('listeners', OnLevelInit=on_level_init)
+    _module(
+        'listeners.tick',
+        Delay=Delay,
+        GameThread=Thread,
+        Repeat=Repeat,
+        RepeatStatus=RepeatStatus,
+    )
+
+    # messages, stringtables
+    class Message:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def send(self, *indexes):
+            world.messages_sent += 1
+
+    _module('messages', HudMsg=Message, SayText2=Message)
+    _module('stringtables')
+    _module('stringtables.downloads', Downloadables=lambda: set())
+
+    # players, filters
+    class Player:
+        def __init__(self, index):
+            if index not in world.players:
+                raise ValueError(f"Index {index} is not a player")
+
+            self.index = index
+            self._state = world.players[index]
+
+        def __eq__(self, other):
+            return self.index == other.index
+
+        def __getattr__(self, attr_name):
+            return getattr(self._state, attr_name)
+
+    class PlayerDictionary(dict):
+        def __init__(self, factory=Player):
+            super().__init__()
+
+            self._factory = factory
+            world.player_dictionaries.append(self)
+
+        def __missing__(self, index):
+            value = self[index] = self._factory(index)
+            return value
+
+        def from_userid(self, userid):
+            return self[world.index_from_userid(userid)]
+
+        def on_automatically_removed(self, index):
+            pass
+
+    _module('players')
+    _module('players.entity', Player=Player)
+    _module('players.dictionary', PlayerDictionary=PlayerDictionary)
+    _module('filters')
+    _module('filters.players', PlayerIter=lambda *args: [
+        Player(index) for index in world.players])
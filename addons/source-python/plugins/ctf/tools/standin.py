@@ -0,0 +1,110 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+from argparse import ArgumentParser
+from random import choice, random
+from time import sleep, time
+
+# CTF
+from ..core.stats import STATS_SOCKET_PATH, StatsStreamer
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+FIRST_SERVER_PORT = 27015
+FLAG_EVENTS = {
+    'steal': ('drop', 'capture'),
+    'drop': ('steal', 'return'),
+}
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class StandInServer:
+    def __init__(self, port, map_name, players, streamer):
+        self.port = port
+        self.map_name = map_name
+        self.players = players
+        self.streamer = streamer
+
+        self._last_events = {'red': 'return', 'blue': 'return'}
+
+    def tick(self):
+        flag = choice(('red', 'blue'))
+        event = choice(FLAG_EVENTS.get(self._last_events[flag], ('steal', )))
+        self._last_events[flag] = event
+
+        # Timed out returns have no player
+        player = None if event == 'return' and random() < 0.5 else choice(
+            self.players)
+
+        self.streamer.push({
+            'server': self.port,
+            'map': self.map_name,
+            'time': time(),
+            'flag': flag,
+            'event': event,
+            'player': None if player is None else player[0],
+            'name': None if player is None else player[1],
+        })
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def main():
+    parser = ArgumentParser(
+        description="Stream synthetic flag events to the stats aggregator "
+                    "as if they came from running CTF servers")
+
+    parser.add_argument("--socket", default=STATS_SOCKET_PATH)
+    parser.add_argument("--servers", type=int, default=4)
+    parser.add_argument("--players", type=int, default=20)
+    parser.add_argument("--map", default="breakfloor_4096")
+    parser.add_argument(
+        "--rate", type=float, default=10.0,
+        help="Events per second per server")
+    parser.add_argument(
+        "--duration", type=float, default=10.0,
+        help="Seconds to run for")
+    parser.add_argument("--buffer-size", type=int, default=1024)
+    parser.add_argument(
+        "--spool", default=None,
+        help="Spool file prefix to use while the aggregator is down")
+
+    args = parser.parse_args()
+
+    players = [
+        (f"STEAM_1:0:{index}", f"Player {index}")
+        for index in range(args.players)
+    ]
+
+    servers = []
+    for index in range(args.servers):
+        streamer = StatsStreamer(args.socket)
+        streamer.start(
+            args.buffer_size,
+            None if args.spool is None else f"{args.spool}{index}.jsonl")
+
+        servers.append(StandInServer(
+            FIRST_SERVER_PORT + index, args.map, players, streamer))
+
+    started_at = time()
+    while time() - started_at < args.duration:
+        for server in servers:
+            server.tick()
+
+        sleep(1 / args.rate)
+
+    for server in servers:
+        server.streamer.stop()
+        print(f"Server {server.port}: sent {server.streamer.sent}, "
+              f"spooled {server.streamer.spooled}, "
+              f"dropped {server.streamer.dropped + server.streamer.overflowed}")
+
+
+if __name__ == "__main__":
+    main()